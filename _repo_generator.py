@@ -2,17 +2,55 @@
     Put this script in the root folder of your repo and it will
     zip up all addon folders, create a new zip in your zips folder
     and then update the md5 and addons.xml file
+
+    Usage: python _repo_generator.py [--jobs N] [--mmap] [--level N]
+
+    With --jobs the addon zips of every Kodi release are compressed by a
+    pool of N worker processes (0 uses every core).
+
+    The inputs of every addon are recorded in the zips/.manifest.json file
+    of the release, thus only the addons whose files changed since the
+    last run are packaged again, even without a version bump.
+
+    The addons.xml file and every created zip get .md5, .sha1 and .sha256
+    checksum files, computed in one pass over the file (memory-mapped with
+    --mmap).
+
+    The zips are reproducible: their entries are sorted and carry fixed
+    timestamps and permissions, already compressed media is stored as it
+    is, and the DEFLATE level is set by --level. The members whose content
+    is the same as in the previous zip of the addon are copied from it
+    without compressing them again.
+
+    Every release folder is scanned once with os.scandir(), the inventory
+    of its files is shared by the removal of the compiled Python files, the
+    manifest and the zips.
 """
 
+import argparse
 import hashlib
+import json
+import mmap
 import os
 import shutil
+import stat
+import struct
 import sys
 import zipfile
+import zlib
 
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from xml.etree import ElementTree
 
 SCRIPT_VERSION = 5
+MANIFEST_FILE = ".manifest.json"
+CHUNK_SIZE = 1024 * 1024
+CHECKSUMS = ["md5", "sha1", "sha256"]
+# Timestamp of every zip entry, the earliest one a zip can hold
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Files that are compressed already, thus they are stored in the zips
+STORED_EXTENSIONS = [".png", ".jpg", ".jpeg", ".gif", ".webp", ".zip", ".gz", ".mp3", ".mp4"]
 KODI_VERSIONS = ["krypton", "leia", "matrix", "nexus", "repo"]
 IGNORE = [
     ".git",
@@ -131,117 +169,474 @@ def convert_bytes(num):
         num /= 1024.0
 
 
+def checksum_file(path, algorithms=CHECKSUMS, use_mmap=False):
+    """
+    Returns the hex digests of a file by algorithm name. The file is read
+    once in chunks and every chunk updates every digest. With use_mmap the
+    chunks are slices of a memory-mapped view of the file.
+    """
+    digests = [hashlib.new(a) for a in algorithms]
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap and size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                view = memoryview(m)
+                try:
+                    for offset in range(0, size, CHUNK_SIZE):
+                        chunk = view[offset:offset + CHUNK_SIZE]
+                        for digest in digests:
+                            digest.update(chunk)
+                        chunk.release()
+                finally:
+                    view.release()
+        else:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                for digest in digests:
+                    digest.update(chunk)
+    return {a: d.hexdigest() for a, d in zip(algorithms, digests)}
+
+
+def hash_file(path):
+    """
+    Returns the sha256 hex digest of a file, read in chunks.
+    """
+    return checksum_file(path, ["sha256"])["sha256"]
+
+
+def crc_file(path):
+    """
+    Returns the CRC32 of a file as a zip records it, read in chunks.
+    """
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def same_files(previous, files):
+    """
+    Return True if the files recorded in the previous manifest have the same
+    names and contents, whatever their mtimes are.
+    """
+    return {n: r[2] for n, r in previous.items()} == {n: r[2] for n, r in files.items()}
+
+
+def read_raw_member(source, info):
+    """
+    Returns the compressed data of a zip member without decompressing it.
+    """
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack("<2H", header[26:30])
+    source.fp.seek(name_length + extra_length, os.SEEK_CUR)
+    return source.fp.read(info.compress_size)
+
+
+def inflate_raw_member(info, data):
+    """
+    Returns the content of a stored or deflated zip member from its compressed data.
+    """
+    if info.compress_type == zipfile.ZIP_STORED:
+        return data
+    return zlib.decompress(data, -zlib.MAX_WBITS)
+
+
+def write_raw_member(target, zinfo, data):
+    """
+    Writes compressed data into a zip as a member. zipfile has no public API
+    for it, thus the local header is written the same way as ZipFile.writestr()
+    writes it, and the output is the same as the one of a fresh compression.
+    """
+    target.fp.seek(target.start_dir)
+    zinfo.header_offset = target.fp.tell()
+    target.fp.write(zinfo.FileHeader(False))
+    target.fp.write(data)
+    target.start_dir = target.fp.tell()
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+    target._didModify = True
+
+
+def is_ignored(name):
+    """
+    Return True if the file is not part of the addon zips. A folder is
+    ignored only if its name is in IGNORE.
+    """
+    return any(name.startswith(i) for i in IGNORE)
+
+
+def is_compiled(name):
+    """
+    Return True if the file is a compiled Python file.
+    """
+    return name.lower().endswith("pyo") or name.lower().endswith("pyc")
+
+
+# A file of an addon: its path relative to the addon folder (with / as the
+# separator), its full path, size, mtime and permission bits
+AddonFile = namedtuple("AddonFile", ["name", "path", "size", "mtime_ns", "mode"])
+
+
+class Inventory:
+    """
+    Files of a release folder found by a single os.scandir() pass. The
+    compiled Python files and __pycache__ folders are collected for their
+    removal, the ignored folders are not entered, and the files of every
+    addon folder (a folder with an addon.xml file) are listed in sorted
+    order with their stat info.
+    """
+
+    def __init__(self, release_path):
+        self.release_path = release_path
+        self.compiled_files = []
+        self.compiled_folders = []
+        self.addons = {}
+
+        with os.scandir(release_path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name == "zips" or entry.name in IGNORE:
+                    continue
+                if "pycache" in entry.name.lower():
+                    self.compiled_folders.append(entry.path)
+                    continue
+                files = []
+                self._scan(entry.path, "", files)
+                if not entry.name.startswith(".") and any(f.name == "addon.xml" for f in files):
+                    self.addons[entry.name] = files
+            elif is_compiled(entry.name):
+                self.compiled_files.append(entry.path)
+
+    def _scan(self, path, prefix, files):
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+
+        for entry in entries:
+            if entry.is_dir():
+                # os.walk() doesn't enter the linked folders either
+                if entry.is_symlink() or entry.name in IGNORE:
+                    continue
+                if "pycache" in entry.name.lower():
+                    self.compiled_folders.append(entry.path)
+                    continue
+                self._scan(entry.path, prefix + entry.name + "/", files)
+            elif is_compiled(entry.name):
+                self.compiled_files.append(entry.path)
+            elif not is_ignored(entry.name):
+                st = entry.stat()
+                files.append(
+                    AddonFile(prefix + entry.name, entry.path, st.st_size, st.st_mtime_ns, st.st_mode)
+                )
+
+
 class Generator:
     """
     Generates a new addons.xml file from each addons addon.xml file
-    and a new addons.xml.md5 hash file. Must be run from the root of
-    the checked-out repo.
+    and new addons.xml.md5, .sha1 and .sha256 hash files. Must be run
+    from the root of the checked-out repo.
+
+    If a process pool is given the addon zips are only submitted to it,
+    wait() has to be called to finish them.
     """
 
-    def __init__(self, release):
+    def __init__(self, release, pool=None, use_mmap=False, compression_level=None):
         self.release_path = release
         self.zips_path = os.path.join(self.release_path, "zips")
+        self.pool = pool
+        self.use_mmap = use_mmap
+        self.compression_level = compression_level
+        self.jobs = []
+        self.manifest_path = os.path.join(self.zips_path, MANIFEST_FILE)
+        self.manifest = {}
         addons_xml_path = os.path.join(self.zips_path, "addons.xml")
-        md5_path = os.path.join(self.zips_path, "addons.xml.md5")
 
         if not os.path.exists(self.zips_path):
             os.makedirs(self.zips_path)
 
+        self.inventory = Inventory(self.release_path)
         self._remove_binaries()
+        previous_manifest = self._load_manifest()
 
-        if self._generate_addons_file(addons_xml_path):
+        if self._generate_addons_file(addons_xml_path, previous_manifest):
             print(
                 "Successfully updated {}".format(color_text(addons_xml_path, 'yellow'))
             )
 
-            if self._generate_md5_file(addons_xml_path, md5_path):
-                print("Successfully updated {}".format(color_text(md5_path, 'yellow')))
+            for checksum_path in self._generate_checksum_files(addons_xml_path):
+                print("Successfully updated {}".format(color_text(checksum_path, 'yellow')))
+
+        if self.pool is None:
+            self._save_manifest()
+
+    def __getstate__(self):
+        # The worker processes only need the paths of the release
+        return {
+            "release_path": self.release_path,
+            "zips_path": self.zips_path,
+            "use_mmap": self.use_mmap,
+            "compression_level": self.compression_level,
+        }
+
+    def _load_manifest(self):
+        """
+        Loads the inputs of the addons recorded by the last run. A manifest
+        of an other script version is ignored.
+        """
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if not isinstance(manifest, dict) or manifest.get("version") != SCRIPT_VERSION:
+            return {}
+        return manifest.get("addons", {})
+
+    def _save_manifest(self):
+        """
+        Saves the inputs of the packaged addons.
+        """
+        data = json.dumps(
+            {"version": SCRIPT_VERSION, "addons": self.manifest}, indent=1, sort_keys=True
+        )
+        self._save_file(data, file=self.manifest_path)
+
+    def _scan_addon(self, folder, previous):
+        """
+        Returns the size, mtime and sha256 digest of every packaged file of
+        the addon folder. The digest of a file whose size and mtime are the
+        same as in the previous manifest is not computed again.
+        """
+        known = previous.get("files", {}) if previous else {}
+        files = {}
+
+        for f in self.inventory.addons[folder]:
+            record = known.get(f.name)
+            if record and record[0] == f.size and record[1] == f.mtime_ns:
+                files[f.name] = record
+            else:
+                files[f.name] = [f.size, f.mtime_ns, hash_file(f.path)]
+
+        return files
+
+    def _zip_path(self, addon_id, version):
+        return os.path.join(self.zips_path, addon_id, "{0}-{1}.zip".format(addon_id, version))
+
+    def _zip_state(self, addon_id, version):
+        """
+        Returns the size and mtime of the zip of the addon, None if it doesn't exist.
+        """
+        try:
+            stat = os.stat(self._zip_path(addon_id, version))
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _zip_matches(self, folder, addon_id, version):
+        """
+        Return True if the names and the CRC32s in the central directory of
+        the zip of the addon are the same as the ones of its files in the
+        inventory.
+        """
+        try:
+            with zipfile.ZipFile(self._zip_path(addon_id, version)) as zip:
+                members = {i.filename: i.CRC for i in zip.infolist() if not i.is_dir()}
+        except (OSError, zipfile.BadZipFile):
+            return False
+
+        files = self.inventory.addons[folder]
+        if set(members) != {"{}/{}".format(folder, f.name) for f in files}:
+            return False
+        return all(members["{}/{}".format(folder, f.name)] == crc_file(f.path) for f in files)
+
+    def _record(self, folder, addon_id, version, files):
+        """
+        Records the inputs of a packaged addon and the state of its zip.
+        """
+        self.manifest[folder] = {
+            "id": addon_id,
+            "version": version,
+            "files": files,
+            "zip": self._zip_state(addon_id, version),
+        }
+
+    def wait(self):
+        """
+        Waits for the addon zips submitted to the process pool.
+        """
+        for folder, job, record in self.jobs:
+            try:
+                job.result()
+                self._record(folder, *record)
+            except Exception as e:
+                print(
+                    "Excluding {}: {}".format(
+                        color_text(folder, 'yellow'), color_text(e, 'red')
+                    )
+                )
+
+        self.jobs = []
+        self._save_manifest()
 
     def _remove_binaries(self):
         """
-        Removes any and all compiled Python files before operations.
+        Removes any and all compiled Python files of the inventory before operations.
         """
 
-        for parent, dirnames, filenames in os.walk(self.release_path):
-            for fn in filenames:
-                if fn.lower().endswith("pyo") or fn.lower().endswith("pyc"):
-                    compiled = os.path.join(parent, fn)
-                    try:
-                        os.remove(compiled)
-                        print(
-                            "Removed compiled python file: {}".format(
-                                color_text(compiled, 'green')
-                            )
-                        )
-                    except:
-                        print(
-                            "Failed to remove compiled python file: {}".format(
-                                color_text(compiled, 'red')
-                            )
-                        )
-            for dir in dirnames:
-                if "pycache" in dir.lower():
-                    compiled = os.path.join(parent, dir)
-                    try:
-                        shutil.rmtree(compiled)
-                        print(
-                            "Removed __pycache__ cache folder: {}".format(
-                                color_text(compiled, 'green')
-                            )
-                        )
-                    except:
-                        print(
-                            "Failed to remove __pycache__ cache folder:  {}".format(
-                                color_text(compiled, 'red')
-                            )
-                        )
+        for compiled in self.inventory.compiled_files:
+            try:
+                os.remove(compiled)
+                print(
+                    "Removed compiled python file: {}".format(
+                        color_text(compiled, 'green')
+                    )
+                )
+            except:
+                print(
+                    "Failed to remove compiled python file: {}".format(
+                        color_text(compiled, 'red')
+                    )
+                )
+        for compiled in self.inventory.compiled_folders:
+            try:
+                shutil.rmtree(compiled)
+                print(
+                    "Removed __pycache__ cache folder: {}".format(
+                        color_text(compiled, 'green')
+                    )
+                )
+            except:
+                print(
+                    "Failed to remove __pycache__ cache folder:  {}".format(
+                        color_text(compiled, 'red')
+                    )
+                )
 
-    def _create_zip(self, folder, addon_id, version):
+    def _create_zip(self, folder, addon_id, version, files):
         """
-        Creates a zip file in the zips directory for the given addon.
+        Creates a reproducible zip file in the zips directory for the given addon
+        from its files listed by the inventory. The members that didn't change are
+        copied from the previous zip of the addon.
         """
-        addon_folder = os.path.join(self.release_path, folder)
         zip_folder = os.path.join(self.zips_path, addon_id)
         if not os.path.exists(zip_folder):
             os.makedirs(zip_folder)
 
         final_zip = os.path.join(zip_folder, "{0}-{1}.zip".format(addon_id, version))
-        if not os.path.exists(final_zip):
-            zip = zipfile.ZipFile(final_zip, "w", compression=zipfile.ZIP_DEFLATED)
-            root_len = len(os.path.dirname(os.path.abspath(addon_folder)))
-
-            for root, dirs, files in os.walk(addon_folder):
-                # remove any unneeded artifacts
-                for i in IGNORE:
-                    if i in dirs:
-                        try:
-                            dirs.remove(i)
-                        except:
-                            pass
-                    for f in files:
-                        if f.startswith(i):
-                            try:
-                                files.remove(f)
-                            except:
-                                pass
-
-                archive_root = os.path.abspath(root)[root_len:]
 
+        # The comment records the compression level, the members of a zip
+        # compressed with an other level are not reused
+        comment = "compresslevel={}".format(
+            -1 if self.compression_level is None else self.compression_level
+        ).encode("utf-8")
+        previous = self._previous_zip(zip_folder, final_zip, comment)
+        reused = 0
+
+        temp_zip = final_zip + ".tmp"
+        try:
+            with zipfile.ZipFile(temp_zip, "w", compression=zipfile.ZIP_DEFLATED) as zip:
+                zip.comment = comment
                 for f in files:
-                    fullpath = os.path.join(root, f)
-                    archive_name = os.path.join(archive_root, f)
-                    zip.write(fullpath, archive_name, zipfile.ZIP_DEFLATED)
+                    with open(f.path, "rb") as src:
+                        data = src.read()
+
+                    archive_name = "{}/{}".format(folder, f.name)
+                    zinfo = zipfile.ZipInfo(archive_name, ZIP_DATE_TIME)
+                    zinfo.create_system = 3
+                    mode = 0o755 if f.mode & stat.S_IXUSR else 0o644
+                    zinfo.external_attr = (stat.S_IFREG | mode) << 16
+                    if os.path.splitext(archive_name)[1].lower() in STORED_EXTENSIONS:
+                        zinfo.compress_type = zipfile.ZIP_STORED
+                    else:
+                        zinfo.compress_type = zipfile.ZIP_DEFLATED
+
+                    # A member is reused if it's inflated to the same content,
+                    # thus a damaged previous zip isn't copied
+                    raw = None
+                    old = previous.NameToInfo.get(archive_name) if previous else None
+                    if (
+                        old is not None
+                        and old.compress_type == zinfo.compress_type
+                        and old.file_size == len(data)
+                        and old.CRC == zlib.crc32(data)
+                        and not old.flag_bits & 0x09
+                        and old.compress_size < zipfile.ZIP64_LIMIT
+                    ):
+                        try:
+                            raw = read_raw_member(previous, old)
+                            if inflate_raw_member(old, raw) != data:
+                                raw = None
+                        except (OSError, struct.error, zlib.error):
+                            raw = None
+
+                    if raw is not None:
+                        zinfo.file_size = old.file_size
+                        zinfo.compress_size = old.compress_size
+                        zinfo.CRC = old.CRC
+                        write_raw_member(zip, zinfo, raw)
+                        reused += 1
+                    else:
+                        zip.writestr(zinfo, data, compresslevel=self.compression_level)
+        except BaseException:
+            if os.path.exists(temp_zip):
+                os.remove(temp_zip)
+            raise
+        finally:
+            if previous:
+                previous.close()
+
+        os.replace(temp_zip, final_zip)
+        size = convert_bytes(os.path.getsize(final_zip))
+        print(
+            "Zip created for {} ({}) - {} ({} of {} files reused)".format(
+                color_text(addon_id, 'cyan'),
+                color_text(version, 'green'),
+                color_text(size, 'yellow'),
+                reused,
+                len(files),
+            )
+        )
 
-            zip.close()
-            size = convert_bytes(os.path.getsize(final_zip))
-            print(
-                "Zip created for {} ({}) - {}".format(
-                    color_text(addon_id, 'cyan'),
-                    color_text(version, 'green'),
-                    color_text(size, 'yellow'),
-                )
+    def _previous_zip(self, zip_folder, final_zip, comment):
+        """
+        Opens the zip the members of the new one can be copied from: the zip of the
+        same version if it exists, otherwise the latest zip of the addon.
+        """
+        if os.path.exists(final_zip):
+            candidates = [final_zip]
+        else:
+            candidates = sorted(
+                (
+                    os.path.join(zip_folder, f)
+                    for f in os.listdir(zip_folder)
+                    if f.endswith(".zip")
+                ),
+                key=os.path.getmtime,
+                reverse=True,
             )
 
+        for candidate in candidates[:1]:
+            try:
+                previous = zipfile.ZipFile(candidate)
+            except (OSError, zipfile.BadZipFile):
+                return None
+            if previous.comment == comment:
+                return previous
+            previous.close()
+
+        return None
+
+    def _package_addon(self, folder, addon_id, version, files):
+        """
+        Creates the zip of the given addon with its checksum files and copies its meta files.
+        """
+        self._create_zip(folder, addon_id, version, files)
+        self._generate_checksum_files(self._zip_path(addon_id, version))
+        self._copy_meta_files(folder, os.path.join(self.zips_path, addon_id))
+
     def _copy_meta_files(self, addon_id, addon_folder):
         """
         Copy the addon.xml and relevant art files into the relevant folders in the repository.
@@ -272,9 +667,11 @@ class Generator:
 
             shutil.copy(addon_path, zips_path)
 
-    def _generate_addons_file(self, addons_xml_path):
+    def _generate_addons_file(self, addons_xml_path, previous_manifest):
         """
         Generates a zip for each found addon, and updates the addons.xml file accordingly.
+        An addon whose files, addons.xml entry and zip are the same as recorded by the
+        previous manifest is skipped without parsing its addon.xml.
         """
         if not os.path.exists(addons_xml_path):
             addons_root = ElementTree.Element('addons')
@@ -283,28 +680,53 @@ class Generator:
             addons_xml = ElementTree.parse(addons_xml_path)
             addons_root = addons_xml.getroot()
 
-        folders = [
-            i
-            for i in os.listdir(self.release_path)
-            if os.path.isdir(os.path.join(self.release_path, i))
-            and i != "zips"
-            and not i.startswith(".")
-            and os.path.exists(os.path.join(self.release_path, i, "addon.xml"))
-        ]
+        # The folders are sorted, thus the addons.xml entries are merged in
+        # the same order whether the zips are created in parallel or not
+        folders = sorted(self.inventory.addons)
 
         addon_xpath = "addon[@id='{}']"
         changed = False
         for addon in folders:
             try:
+                previous = previous_manifest.get(addon)
+                files = self._scan_addon(addon, previous)
+
+                if previous and same_files(previous["files"], files):
+                    addon_entry = addons_root.find(addon_xpath.format(previous["id"]))
+                    if (
+                        addon_entry is not None
+                        and addon_entry.get('version') == previous["version"]
+                        and previous["zip"] is not None
+                        and self._zip_state(previous["id"], previous["version"]) == previous["zip"]
+                    ):
+                        self.manifest[addon] = dict(previous, files=files)
+                        continue
+
                 addon_xml_path = os.path.join(self.release_path, addon, "addon.xml")
                 addon_xml = ElementTree.parse(addon_xml_path)
                 addon_root = addon_xml.getroot()
                 id = addon_root.get('id')
                 version = addon_root.get('version')
 
+                # The files changed since the last run without a version bump,
+                # or the zip is missing or was changed since it was created. A
+                # zip without a record is adopted only if it holds the files
+                zip_state = self._zip_state(id, version)
+                if zip_state is None:
+                    stale = True
+                elif previous is None:
+                    stale = not self._zip_matches(addon, id, version)
+                else:
+                    stale = (
+                        not same_files(previous["files"], files)
+                        or previous["id"] != id
+                        or previous["version"] != version
+                        or zip_state != previous["zip"]
+                    )
+
                 updated = False
                 addon_entry = addons_root.find(addon_xpath.format(id))
-                if addon_entry is not None and addon_entry.get('version') != version:
+                if addon_entry is not None and (addon_entry.get('version') != version or stale):
                     index = addons_root.findall('addon').index(addon_entry)
                     addons_root.remove(addon_entry)
                     addons_root.insert(index, addon_root)
@@ -316,9 +738,28 @@ class Generator:
                     changed = True
 
                 if updated:
-                    # Create the zip files
-                    self._create_zip(addon, id, version)
-                    self._copy_meta_files(addon, os.path.join(self.zips_path, id))
+                    # Create the zip files. A zip of the same version is
+                    # created again from the changed files
+                    if self.pool is None:
+                        self._package_addon(addon, id, version, self.inventory.addons[addon])
+                        self._record(addon, id, version, files)
+                    else:
+                        self.jobs.append(
+                            (
+                                addon,
+                                self.pool.submit(
+                                    self._package_addon, addon, id, version, self.inventory.addons[addon]
+                                ),
+                                (id, version, files),
+                            )
+                        )
+                else:
+                    # An addon packaged with its current files before the
+                    # manifest was introduced, or before the checksum files
+                    self._record(addon, id, version, files)
+                    final_zip = self._zip_path(id, version)
+                    if not os.path.exists("{}.{}".format(final_zip, CHECKSUMS[-1])):
+                        self._generate_checksum_files(final_zip)
             except Exception as e:
                 print(
                     "Excluding {}: {}".format(
@@ -341,22 +782,28 @@ class Generator:
                     )
                 )
 
-    def _generate_md5_file(self, addons_xml_path, md5_path):
+    def _generate_checksum_files(self, path):
         """
-        Generates a new addons.xml.md5 file.
+        Generates the .md5, .sha1 and .sha256 files of the given file.
+        Returns the paths of the checksum files.
         """
         try:
-            with open(addons_xml_path, "r", encoding="utf-8") as f:
-                m = hashlib.md5(f.read().encode("utf-8")).hexdigest()
-                self._save_file(m, file=md5_path)
-
-            return True
+            checksums = checksum_file(path, CHECKSUMS, self.use_mmap)
         except Exception as e:
             print(
-                "An error occurred updating {}!\n{}".format(
-                    color_text(md5_path, 'yellow'), color_text(e, 'red')
+                "An error occurred computing the checksums of {}!\n{}".format(
+                    color_text(path, 'yellow'), color_text(e, 'red')
                 )
             )
+            return []
+
+        checksum_paths = []
+        for algorithm in CHECKSUMS:
+            checksum_path = "{}.{}".format(path, algorithm)
+            self._save_file(checksums[algorithm], file=checksum_path)
+            checksum_paths.append(checksum_path)
+
+        return checksum_paths
 
     def _save_file(self, data, file):
         """
@@ -374,5 +821,35 @@ class Generator:
 
 
 if __name__ == "__main__":
-    for release in [r for r in KODI_VERSIONS if os.path.exists(r)]:
-        Generator(release)
+    parser = argparse.ArgumentParser(description="Generates the zips and the addons.xml files of the repo.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes creating the addon zips (0 uses every core, 1 creates them one after another)",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        choices=range(0, 10),
+        default=None,
+        help="DEFLATE compression level of the zips (default: the zlib default)",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="read the files memory-mapped while computing their checksums",
+    )
+    args = parser.parse_args()
+
+    releases = [r for r in KODI_VERSIONS if os.path.exists(r)]
+    if args.jobs == 1:
+        for release in releases:
+            Generator(release, use_mmap=args.mmap, compression_level=args.level)
+    else:
+        # The zips of every release share the pool, thus a release with few
+        # addons doesn't leave the cores idle
+        with ProcessPoolExecutor(max_workers=args.jobs or None) as pool:
+            generators = [Generator(release, pool, args.mmap, args.level) for release in releases]
+            for generator in generators:
+                generator.wait()
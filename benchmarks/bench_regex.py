@@ -0,0 +1,73 @@
+"""
+    Micro-benchmark of the result page extraction of the Babel subtitle addon.
+
+    Compares the original extraction (raw pattern string compiled on every
+    call plus a separate tag stripping pass per row) with the single-pass
+    extraction of the precompiled PATTERNS registry and with the streaming
+    ResultPageParser.
+
+    Usage: python benchmarks/bench_regex.py [saved_result_page.html ...]
+
+    Without arguments a synthetic result page is used.
+"""
+
+import os
+import re
+import sys
+import timeit
+
+ADDON_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    os.pardir,
+    "repo",
+    "script.subtitles.babel-0.0.3",
+)
+sys.path.insert(0, ADDON_PATH)
+
+from fixtures import synthetic_page  # noqa: E402
+from resources.lib.parser import ResultPageParser, extract_rows  # noqa: E402
+
+LEGACY_PATTERN = r'<tr id="vilagit".*?<small>(.*?)</small>.*?class="magyar">(.*?)</div>.*?href="([^"]*?action=letolt[^"]*)"'
+
+
+def legacy(page):
+    matches = re.findall(LEGACY_PATTERN, page, re.DOTALL)
+    return [
+        (lang, re.sub(r"<[^>]*>", "", title).strip(), link.replace("&amp;", "&"))
+        for lang, title, link in matches
+    ]
+
+
+def streaming(page, chunk_size=16 * 1024):
+    parser = ResultPageParser()
+    rows = list()
+    for i in range(0, len(page), chunk_size):
+        parser.feed(page[i : i + chunk_size])
+        rows += parser.pop_rows()
+    parser.close()
+    return rows + parser.pop_rows()
+
+
+def main(paths):
+    if paths:
+        pages = {}
+        for path in paths:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                pages[os.path.basename(path)] = f.read()
+    else:
+        pages = {"synthetic (200 rows)": synthetic_page()}
+
+    for name, page in pages.items():
+        print("{} - {} bytes, {} rows".format(name, len(page), len(extract_rows(page))))
+        for label, func in [
+            ("legacy regex + tag strip", legacy),
+            ("precompiled single pass", extract_rows),
+            ("streaming HTMLParser", streaming),
+        ]:
+            number = 20
+            seconds = min(timeit.repeat(lambda: func(page), number=number, repeat=5))
+            print("  {:<28} {:8.3f} ms/page".format(label, seconds / number * 1000))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,234 @@
+"""
+    Offline benchmark of the search pipeline of the Babel subtitle addon.
+
+    Runs service.search() against a local stand-in of https://feliratok.eu
+    that serves a corpus of result pages (single-page, many-page, huge-page
+    and maintenance-page cases) with stub Kodi modules. Reports the wall time
+    and the time spent in networking, in parsing and in building the listing,
+    the allocations of the run and the number of pages per second.
+
+    Usage: python benchmarks/bench_search.py [--corpus DIR] [--repeat N]
+                                             [--latency MS] [--workers N]
+                                             [--engine threads|asyncio]
+
+    The network stage is measured for the threads engine only, the asyncio
+    engine interleaves the downloads in one event loop.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+ADDON_PATH = os.path.join(BENCHMARK_PATH, os.pardir, "repo", "script.subtitles.babel-0.0.3")
+
+sys.path.insert(0, ADDON_PATH)
+sys.path.insert(0, os.path.join(BENCHMARK_PATH, "stubs"))
+
+import xbmcaddon  # noqa: E402
+import xbmcplugin  # noqa: E402
+
+import fixtures  # noqa: E402
+from server import FeliratokServer  # noqa: E402
+
+STAGES = ("network", "parse", "listing")
+
+
+class StageTimer:
+    """
+    Thread safe accumulator of the time spent in the stages of the pipeline.
+    The pages 2..N are downloaded by worker threads, thus the stage totals
+    can be larger than the wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = defaultdict(float)
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.totals[stage] += seconds
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+
+
+def instrument(service, timer):
+    """
+    Wraps the stage functions of the service module with timers. The parser
+    is imported by the search functions on their first call, thus it's
+    wrapped in its own module.
+    """
+    from resources.lib import parser
+
+    client = service.get_client()
+    open_url = client.open
+
+    def timed_open(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return open_url(*args, **kwargs)
+        finally:
+            timer.add("network", time.perf_counter() - start)
+
+    iter_html_content = service.iter_html_content
+
+    def timed_iter_html_content(url, response=None):
+        chunks = iter_html_content(url, response)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                timer.add("network", time.perf_counter() - start)
+                return
+            timer.add("network", time.perf_counter() - start)
+            yield chunk
+
+    class TimedResultPageParser(parser.ResultPageParser):
+        def feed(self, data):
+            start = time.perf_counter()
+            super().feed(data)
+            timer.add("parse", time.perf_counter() - start)
+
+    extract_rows = parser.extract_rows
+
+    def timed_extract_rows(page):
+        start = time.perf_counter()
+        rows = extract_rows(page)
+        timer.add("parse", time.perf_counter() - start)
+        return rows
+
+    add_results = service.add_results
+
+    def timed_add_results(*args):
+        start = time.perf_counter()
+        add_results(*args)
+        timer.add("listing", time.perf_counter() - start)
+
+    client.open = timed_open
+    service.iter_html_content = timed_iter_html_content
+    parser.ResultPageParser = TimedResultPageParser
+    parser.extract_rows = timed_extract_rows
+    service.add_results = timed_add_results
+
+
+def run_once(service, server):
+    """
+    Runs one search as a fresh plugin invocation would. Returns the wall
+    time in seconds.
+    """
+    xbmcplugin.reset()
+    # Every plugin invocation starts without open connections
+    service.get_client().close()
+
+    start = time.perf_counter()
+    service.search("Sorozat")
+    return time.perf_counter() - start
+
+
+def benchmark_case(service, server, timer, name, pages, repeat):
+    server.serve(pages)
+
+    walls = []
+    stage_runs = defaultdict(list)
+    for _ in range(repeat):
+        timer.reset()
+        walls.append(run_once(service, server))
+        for stage in STAGES:
+            stage_runs[stage].append(timer.totals[stage])
+    requests = len(server.requests)
+
+    # The allocations are measured on a separate run as tracemalloc slows
+    # down everything
+    tracemalloc.start()
+    run_once(service, server)
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+
+    wall = statistics.median(walls)
+    pages_fetched = requests // repeat
+    return {
+        "case": name,
+        "wall": wall,
+        "stages": {stage: statistics.median(stage_runs[stage]) for stage in STAGES},
+        "pages": pages_fetched,
+        "pages_per_second": pages_fetched / wall if wall else 0.0,
+        "rows": len(xbmcplugin.items),
+        "peak_kib": peak / 1024.0,
+        "blocks": blocks,
+    }
+
+
+def print_report(results):
+    header = "{:<18} {:>9} {:>9} {:>9} {:>9} {:>6} {:>8} {:>7} {:>9} {:>8}".format(
+        "case", "wall ms", "net ms", "parse ms", "list ms", "pages", "pages/s", "rows", "peak KiB", "blocks"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            "{:<18} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>6d} {:>8.1f} {:>7d} {:>9.1f} {:>8d}".format(
+                result["case"],
+                result["wall"] * 1000,
+                result["stages"]["network"] * 1000,
+                result["stages"]["parse"] * 1000,
+                result["stages"]["listing"] * 1000,
+                result["pages"],
+                result["pages_per_second"],
+                result["rows"],
+                result["peak_kib"],
+                result["blocks"],
+            )
+        )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--corpus", help="folder of a recorded corpus, one sub-folder per case")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="number of timed runs per case")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="artificial server latency in ms")
+    arg_parser.add_argument("--workers", type=int, default=4, help="value of the 'page_workers' setting")
+    arg_parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads", help="search engine")
+    args = arg_parser.parse_args()
+
+    corpus = fixtures.load_corpus(args.corpus) if args.corpus else fixtures.builtin_corpus()
+
+    # The search and page caches would hide every run after the first one,
+    # the rate limit would throttle the back-to-back runs and the
+    # maintenance case would open the circuit breaker for the other cases
+    xbmcaddon.settings.update({
+        "cache_ttl": "0",
+        "page_cache_size": "0",
+        "request_rate": "0",
+        "maintenance_cooldown": "0",
+        "page_workers": str(args.workers),
+        "async_engine": "true" if args.engine == "asyncio" else "false",
+    })
+    sys.argv = ["plugin://script.subtitles.babel/", "1", "?action=search"]
+
+    import service
+
+    timer = StageTimer()
+    instrument(service, timer)
+
+    with FeliratokServer(latency=args.latency / 1000.0) as server:
+        service.main_link = server.url
+        results = [
+            benchmark_case(service, server, timer, name, pages, args.repeat)
+            for name, pages in corpus.items()
+        ]
+
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+    Startup benchmark of the plugin invocations of the Babel subtitle addon.
+
+    Kodi starts a new Python interpreter for every plugin invocation, thus
+    the modules imported by service.py are paid for by every search and
+    download. Every case runs one invocation in a fresh interpreter with
+    'python -X importtime' against a local stand-in of https://feliratok.eu
+    and reports the wall time of the invocation, the time spent importing
+    modules, the number of imported modules and the heavy modules that were
+    loaded. The stub Kodi modules are imported before the measurement, the
+    real ones are built into Kodi.
+
+    Usage: python benchmarks/bench_startup.py [--repeat N] [--top N]
+                                              [--engine threads|asyncio]
+"""
+
+import argparse
+import compileall
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from urllib.parse import urlencode
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+ADDON_PATH = os.path.join(BENCHMARK_PATH, os.pardir, "repo", "script.subtitles.babel-0.0.3")
+
+sys.path.insert(0, os.path.join(BENCHMARK_PATH, "stubs"))
+
+import fixtures  # noqa: E402
+from server import FeliratokServer  # noqa: E402
+
+# Line written to stderr by the probe right before 'import service'
+MARKER = "-- babel startup --"
+
+# Modules that only some of the actions need
+HEAVY_MODULES = (
+    "asyncio", "concurrent.futures", "ssl", "http.client", "html.parser", "zipfile", "sqlite3", "tempfile",
+)
+
+# Runs one plugin invocation. Arguments: stubs folder, addon folder, main
+# link, profile folder, plugin query string and key=value settings. Only
+# builtin modules are imported before the marker, thus the imports of the
+# addon are not hidden by the probe
+PROBE = r"""
+import sys
+import time
+
+stubs, addon, main_link, profile, query = sys.argv[1:6]
+sys.path[:0] = [stubs, addon]
+
+import xbmc, xbmcaddon, xbmcgui, xbmcplugin, xbmcvfs
+
+xbmcaddon.profile = profile
+xbmcaddon.settings.update(setting.split("=", 1) for setting in sys.argv[6:])
+xbmc.info_labels["VideoPlayer.Title"] = "Sorozat"
+sys.argv = ["plugin://script.subtitles.babel/", "1", query]
+
+sys.stderr.write("%s\n")
+sys.stderr.flush()
+
+start = time.perf_counter()
+import service
+service.main_link = main_link
+service.main()
+print(time.perf_counter() - start, len(xbmcplugin.items))
+""" % MARKER
+
+
+def parse_importtime(stderr):
+    """
+    Returns the (module, self seconds) pairs of the '-X importtime' report
+    written after the marker.
+    """
+    imports = []
+    measuring = False
+    for line in stderr.splitlines():
+        if line == MARKER:
+            measuring = True
+        elif measuring and line.startswith("import time:"):
+            fields = line[len("import time:"):].split("|")
+            if fields[0].strip().isdigit():
+                imports.append((fields[2].strip(), int(fields[0]) / 1e6))
+    return imports
+
+
+def run_invocation(server, addon_path, profile, query, settings):
+    """
+    Runs one plugin invocation in a fresh interpreter. Returns the wall
+    time, the number of listed items and the imports of the invocation.
+    """
+    command = [
+        sys.executable, "-X", "importtime", "-c", PROBE,
+        os.path.join(BENCHMARK_PATH, "stubs"), addon_path, server.url, profile, query,
+    ] + ["{}={}".format(key, value) for key, value in settings.items()]
+    result = subprocess.run(command, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError("invocation failed: {}".format(result.stderr.strip().splitlines()[-1:]))
+
+    wall, items = result.stdout.split()[-2:]
+    return float(wall), int(items), parse_importtime(result.stderr)
+
+
+def cases(server):
+    """
+    Returns the (name, query, warm) triples of the cases. A warm case runs
+    once before the measurement, thus it's served from the caches.
+    """
+    languages = {"languages": "English,Hungarian", "preferredlanguage": "Hungarian"}
+    download = server.url + "/index.php?action=letolt&fnev=Sorozat.S01E01.srt&felirat=1"
+    season_pack = server.url + "/index.php?action=letolt&fnev=Sorozat.S01.zip&felirat=2"
+    return [
+        ("search", "?" + urlencode(dict(languages, action="search")), False),
+        ("search (cached)", "?" + urlencode(dict(languages, action="search")), True),
+        ("manualsearch", "?" + urlencode(dict(languages, action="manualsearch", searchstring="Sorozat")), False),
+        ("download", "?" + urlencode({"action": "download", "url": download, "title": "Sorozat"}), False),
+        ("download (zip)", "?" + urlencode({"action": "download", "url": season_pack, "title": "Sorozat"}), False),
+    ]
+
+
+def benchmark_case(server, addon_path, query, warm, repeat, settings):
+    walls = []
+    import_times = []
+    modules = []
+    loaded = set()
+    self_times = defaultdict(list)
+    for _ in range(repeat):
+        profile = tempfile.mkdtemp(prefix="babel-startup-")
+        try:
+            destination = os.path.join(profile, "felirat.srt")
+            case_query = query + "&" + urlencode({"destfile": destination}) if "download" in query else query
+            if warm:
+                run_invocation(server, addon_path, profile, case_query, settings)
+            wall, items, imports = run_invocation(server, addon_path, profile, case_query, settings)
+        finally:
+            shutil.rmtree(profile, ignore_errors=True)
+
+        walls.append(wall)
+        import_times.append(sum(seconds for _, seconds in imports))
+        modules.append(len(imports))
+        for name, seconds in imports:
+            self_times[name].append(seconds)
+        loaded.update(name for name, _ in imports if name in HEAVY_MODULES)
+
+    return {
+        "wall": statistics.median(walls),
+        "imports": statistics.median(import_times),
+        "modules": int(statistics.median(modules)),
+        "items": items,
+        "heavy": [name for name in HEAVY_MODULES if name in loaded],
+        "top": sorted(
+            ((statistics.median(times), name) for name, times in self_times.items()), reverse=True
+        ),
+    }
+
+
+def print_report(results, top):
+    header = "{:<16} {:>9} {:>10} {:>8} {:>6}  {}".format("case", "wall ms", "import ms", "modules", "items", "heavy modules")
+    print(header)
+    print("-" * len(header))
+    for name, result in results:
+        print(
+            "{:<16} {:>9.1f} {:>10.1f} {:>8d} {:>6d}  {}".format(
+                name,
+                result["wall"] * 1000,
+                result["imports"] * 1000,
+                result["modules"],
+                result["items"],
+                ", ".join(result["heavy"]) or "-",
+            )
+        )
+
+    if top:
+        print()
+        for name, result in results:
+            slowest = ", ".join("{} {:.1f}".format(module, seconds * 1000) for seconds, module in result["top"][:top])
+            print("{:<16} {}".format(name, slowest))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=5, help="number of timed invocations per case")
+    arg_parser.add_argument("--top", type=int, default=5, help="number of the slowest imports listed per case")
+    arg_parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads", help="search engine")
+    args = arg_parser.parse_args()
+
+    # The rate limit and the circuit breaker are not part of the startup
+    settings = {
+        "request_rate": "0",
+        "maintenance_cooldown": "0",
+        "async_engine": "true" if args.engine == "asyncio" else "false",
+    }
+
+    # Kodi writes the bytecode of the addon on the first invocation, thus
+    # the compilation of the sources is not part of the startup. A copy of
+    # the addon is compiled, thus no bytecode is left in the source tree
+    build_path = tempfile.mkdtemp(prefix="babel-startup-addon-")
+    try:
+        addon_path = os.path.join(build_path, os.path.basename(os.path.normpath(ADDON_PATH)))
+        shutil.copytree(ADDON_PATH, addon_path, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+        compileall.compile_dir(addon_path, quiet=1)
+
+        with FeliratokServer() as server:
+            server.serve(fixtures.builtin_corpus()["single-page"])
+            results = [
+                (name, benchmark_case(server, addon_path, query, warm, args.repeat, settings))
+                for name, query, warm in cases(server)
+            ]
+    finally:
+        shutil.rmtree(build_path, ignore_errors=True)
+
+    print_report(results, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+    Corpus of feliratok.eu result pages for the offline benchmarks.
+
+    A corpus is a dict of cases, every case is the list of its result pages
+    in page order. The built-in corpus is generated with the same structure
+    as the feliratok.eu pages. A recorded corpus can be loaded from a folder
+    that has one sub-folder per case with the pages saved as 1.html, 2.html...
+"""
+
+import os
+
+MAINTENANCE_PAGE = "Karbantartas, hamarosan jovunk vissza!"
+
+_LANGUAGES = ["Magyar", "Angol", "Német", "Spanyol"]
+
+
+def _row(index):
+    return (
+        '<tr id="vilagit" class="feliratsor">'
+        '<td><small>{lang}</small></td>'
+        '<td><div class="magyar">Sorozat - 1x{episode:02d}</div>'
+        '<div class="eredeti">Series - 1x{episode:02d} (Series.S01E{episode:02d}.1080p.WEB.H264-GRP{index})</div></td>'
+        '<td><a href="/index.php?action=letolt&amp;fnev=Series.S01E{episode:02d}.srt&amp;felirat={index}">'
+        "Letöltés</a></td></tr>\n"
+    ).format(
+        lang=_LANGUAGES[index % len(_LANGUAGES)],
+        episode=index % 24 + 1,
+        index=index,
+    )
+
+
+def result_page(rows, first_row=0, pages=1):
+    """
+    Builds a result page with the given number of rows. A pagination block
+    is added if the result has more than one page.
+    """
+    pagination = ""
+    if pages > 1:
+        pagination = '<div class="pagination">{}</div>'.format(
+            "".join('<a href="index.php?page={0}">{0}</a>'.format(p) for p in range(1, pages + 1))
+        )
+
+    return (
+        "<!DOCTYPE html><html><head><title>Feliratok</title></head><body>"
+        '<div id="header">feliratok.eu</div>{pagination}'
+        '<table class="result">{rows}</table>{pagination}'
+        "</body></html>"
+    ).format(
+        pagination=pagination,
+        rows="".join(_row(i) for i in range(first_row, first_row + rows)),
+    )
+
+
+def synthetic_page(rows=200):
+    """
+    Builds a single result page with the given number of rows.
+    """
+    return result_page(rows)
+
+
+def builtin_corpus():
+    """
+    Returns the built-in corpus: single-page, many-page, huge-page and
+    maintenance-page cases.
+    """
+    many_pages = 10
+    return {
+        "single-page": [result_page(25)],
+        "many-page": [
+            result_page(50, first_row=page * 50, pages=many_pages)
+            for page in range(many_pages)
+        ],
+        "huge-page": [result_page(5000)],
+        "maintenance-page": [MAINTENANCE_PAGE],
+    }
+
+
+def load_corpus(folder):
+    """
+    Loads a recorded corpus from the given folder.
+    """
+    corpus = {}
+    for case in sorted(os.listdir(folder)):
+        case_folder = os.path.join(folder, case)
+        if not os.path.isdir(case_folder):
+            continue
+        pages = sorted(
+            (f for f in os.listdir(case_folder) if f.endswith(".html")),
+            key=lambda f: int(os.path.splitext(f)[0]),
+        )
+        corpus[case] = []
+        for page in pages:
+            with open(os.path.join(case_folder, page), "r", encoding="utf-8", errors="ignore") as f:
+                corpus[case].append(f.read())
+    return corpus
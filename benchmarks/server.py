@@ -0,0 +1,131 @@
+"""
+    Local stand-in of https://feliratok.eu for the offline benchmarks.
+
+    Serves the pages of one corpus case by the 'page' query parameter and a
+    small subtitle file for the 'action=letolt' download links, or a zipped
+    season pack if the 'fnev' parameter of the link ends with '.zip'. The
+    'action=autoname' series name suggestion knows one series, 'Sorozat'. The
+    result pages have an ETag and a matching 'If-None-Match' request gets a
+    '304 Not Modified' response. The responses
+    are gzip compressed if the client accepts it, and an artificial latency
+    can be added to simulate the round trip time of a real network.
+"""
+
+import gzip
+import hashlib
+import http.server
+import io
+import json
+import threading
+import time
+import zipfile
+from urllib.parse import parse_qsl, urlsplit
+
+SUBTITLE = b"1\r\n00:00:01,000 --> 00:00:02,000\r\nBabel\r\n"
+
+
+def season_pack(episodes=10):
+    """
+    Zips one subtitle per episode like the season packs of the website.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for episode in range(1, episodes + 1):
+            name = "Sorozat.S01E{:02d}.720p.WEB.srt".format(episode)
+            archive.writestr(name, SUBTITLE.replace(b"Babel", "Babel {}".format(episode).encode("ascii")))
+    return buffer.getvalue()
+
+
+SEASON_PACK = season_pack()
+
+SERIES = [{"name": "Sorozat (2020)", "ID": "42"}]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        query = dict(parse_qsl(urlsplit(self.path).query))
+
+        with server.lock:
+            server.requests.append(self.path)
+            server.connections.add(self.client_address)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        etag = None
+        if query.get("action") == "letolt":
+            body = SEASON_PACK if query.get("fnev", "").endswith(".zip") else SUBTITLE
+        elif query.get("action") == "autoname":
+            term = query.get("term", "").lower()
+            body = json.dumps([series for series in SERIES if term and term in series["name"].lower()]).encode("utf-8")
+        else:
+            pages = server.pages
+            index = int(query.get("page", 1)) - 1
+            if not 0 <= index < len(pages):
+                self.send_error(404)
+                return
+            body = pages[index].encode("utf-8")
+            etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+        compress = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        if compress:
+            body = gzip.compress(body, compresslevel=5)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FeliratokServer(http.server.ThreadingHTTPServer):
+    """
+    Stand-in server. Use 'url' as the main link of the addon.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.pages = []
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_port)
+
+    def serve(self, pages):
+        """
+        Sets the pages of the case to serve and clears the statistics.
+        """
+        with self.lock:
+            self.pages = pages
+            self.requests = []
+            self.connections = set()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
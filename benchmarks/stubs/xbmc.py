@@ -0,0 +1,83 @@
+"""
+    Minimal stand-in of the Kodi 'xbmc' module for the offline benchmarks.
+"""
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+
+ISO_639_1 = 0
+ISO_639_2 = 1
+ENGLISH_NAME = 2
+
+# Every logged message, the benchmarks can inspect them
+messages = []
+
+# Values returned by getInfoLabel()
+info_labels = {}
+
+
+def log(msg, level=LOGDEBUG):
+    messages.append((level, msg))
+
+
+def getInfoLabel(label):
+    return info_labels.get(label, "")
+
+
+_LANGUAGE_CODES = {
+    "english": ("en", "eng"),
+    "hungarian": ("hu", "hun"),
+    "german": ("de", "ger"),
+    "spanish": ("es", "spa"),
+}
+
+
+def convertLanguage(language, format):
+    codes = _LANGUAGE_CODES.get(language.lower())
+    if not codes:
+        return ""
+    return codes[0] if format == ISO_639_1 else codes[1]
+
+
+def sleep(milliseconds):
+    pass
+
+
+class InfoTagVideo:
+    # Kodi returns -1 for the unknown numbers
+    _DEFAULTS = {"season": -1, "episode": -1, "year": 0}
+
+    def __init__(self, **tags):
+        self._tags = tags
+
+    def __getattr__(self, name):
+        if name.startswith("get"):
+            key = name[3:].lower()
+            return lambda: self._tags.get(key, self._DEFAULTS.get(key, ""))
+        raise AttributeError(name)
+
+
+class Player:
+    # Set by the benchmarks to simulate a playing video
+    playing_file = ""
+    video_info_tag = None
+
+    def isPlayingVideo(self):
+        return Player.video_info_tag is not None
+
+    def getPlayingFile(self):
+        return Player.playing_file
+
+    def getVideoInfoTag(self):
+        return Player.video_info_tag or InfoTagVideo()
+
+
+class Monitor:
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        return False
@@ -0,0 +1,57 @@
+"""
+    Minimal stand-in of the Kodi 'xbmcaddon' module for the offline benchmarks.
+"""
+
+import os
+import tempfile
+from xml.etree import ElementTree
+
+SETTINGS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+    "repo", "script.subtitles.babel-0.0.3", "resources", "settings.xml",
+)
+
+
+def load_defaults(path=SETTINGS_PATH):
+    """
+    Returns the default values of the settings of the addon, thus the
+    benchmarks measure the configuration that is shipped.
+    """
+    return {
+        setting.get("id"): setting.get("default", "")
+        for setting in ElementTree.parse(path).iter("setting")
+        if setting.get("id")
+    }
+
+
+# Default values of the settings of the addon
+defaults = load_defaults()
+
+# Values returned by getSetting() instead of the defaults, the benchmarks can
+# override them
+settings = {}
+
+# Addon data folder of the benchmark run
+profile = os.path.join(tempfile.gettempdir(), "babel-benchmark-profile")
+
+
+class Addon:
+    def __init__(self, id=None):
+        pass
+
+    def getSetting(self, id):
+        return settings.get(id, defaults.get(id, ""))
+
+    def getSettingBool(self, id):
+        return self.getSetting(id) == "true"
+
+    def getSettingInt(self, id):
+        return int(self.getSetting(id) or 0)
+
+    def getAddonInfo(self, id):
+        return {
+            "id": "script.subtitles.babel",
+            "profile": profile,
+            "path": "",
+            "version": "0.0.3",
+        }.get(id, "")
@@ -0,0 +1,58 @@
+"""
+    Minimal stand-in of the Kodi 'xbmcgui' module for the offline benchmarks.
+"""
+
+NOTIFICATION_INFO = "info"
+NOTIFICATION_WARNING = "warning"
+NOTIFICATION_ERROR = "error"
+
+# Every shown notification, the benchmarks can inspect them
+notifications = []
+
+
+# The major version of the modeled Kodi API. The info tag of Kodi 19
+# (Matrix) has getters only, the setters were added in Kodi 20
+kodi_version = 20
+
+
+class _MatrixVideoInfoTag:
+    def __init__(self):
+        self.title = ""
+
+    def getTitle(self):
+        return self.title
+
+
+class _VideoInfoTag(_MatrixVideoInfoTag):
+    def setTitle(self, title):
+        self.title = title
+
+
+class ListItem:
+    def __init__(self, label="", label2="", path="", offscreen=False):
+        self.label = label
+        self.label2 = label2
+        self.path = path
+        self.art = {}
+        self.properties = {}
+        self.info_tag = _VideoInfoTag() if kodi_version >= 20 else _MatrixVideoInfoTag()
+
+    def setArt(self, values):
+        self.art.update(values)
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def getProperty(self, key):
+        return self.properties.get(key, "")
+
+    def getVideoInfoTag(self):
+        return self.info_tag
+
+    def setInfo(self, type, infoLabels):
+        self.info_tag.title = infoLabels.get("title", "")
+
+
+class Dialog:
+    def notification(self, heading, message, icon=NOTIFICATION_INFO, time=5000, sound=True):
+        notifications.append((heading, message))
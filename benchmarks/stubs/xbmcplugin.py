@@ -0,0 +1,33 @@
+"""
+    Minimal stand-in of the Kodi 'xbmcplugin' module for the offline benchmarks.
+"""
+
+# Listed items and the number of calls, the benchmarks can inspect them
+items = []
+calls = {"addDirectoryItem": 0, "addDirectoryItems": 0, "endOfDirectory": 0}
+
+
+def reset():
+    del items[:]
+    for key in calls:
+        calls[key] = 0
+
+
+def setContent(handle, content):
+    pass
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    calls["addDirectoryItem"] += 1
+    items.append((url, listitem, isFolder))
+    return True
+
+
+def addDirectoryItems(handle, items_to_add, totalItems=0):
+    calls["addDirectoryItems"] += 1
+    items.extend(items_to_add)
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    calls["endOfDirectory"] += 1
@@ -0,0 +1,64 @@
+"""
+    Minimal stand-in of the Kodi 'xbmcvfs' module for the offline benchmarks.
+"""
+
+import os
+import shutil
+import tempfile
+
+
+def translatePath(path):
+    return path.replace("special://temp", tempfile.gettempdir())
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+
+def delete(path):
+    try:
+        os.remove(path)
+    except OSError:
+        return False
+    return True
+
+
+def copy(source, destination):
+    shutil.copyfile(source, destination)
+    return True
+
+
+def listdir(path):
+    dirs, files = [], []
+    for name in os.listdir(path):
+        (dirs if os.path.isdir(os.path.join(path, name)) else files).append(name)
+    return dirs, files
+
+
+class File:
+    def __init__(self, path, mode="r"):
+        self._file = open(path, mode.replace("b", "") + "b")
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readBytes(self, size=-1):
+        return self._file.read(size)
+
+    def write(self, data):
+        self._file.write(data)
+        return True
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Background service of the Babel subtitle addon
+
+While an episode of a series is played the subtitles of the next episodes are
+searched (and optionally downloaded) ahead of time, thus opening the subtitle
+dialog on the next episode is served from the cache of the addon. The
+prefetch has low priority: it starts after the playback settled, downloads
+the result pages one by one and pauses between the searches.
+"""
+
+__author__ = "g0m3z"
+__copyright__ = "Copyright 2026, Babel subtitle addon for Kodi"
+__license__ = "GNU GPLv2"
+__version__ = "0.0.3"
+__maintainer__ = "g0m3z"
+__email__ = "g0m3z78 [at] googel's email service"
+__status__ = "Beta"
+
+import xbmc
+
+import service
+
+
+class PrefetchPlayer(xbmc.Player):
+    """
+    Player that flags the start of every playback for the prefetch loop
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.started = False
+
+    def onAVStarted(self):
+        self.started = True
+
+
+def prefetch_next_episodes(monitor, player):
+    """
+    Prefetches the subtitles of the episodes following the played one. The prefetch stops if Kodi exits, or the playback stops or changes
+
+    Args:
+        monitor: xbmc.Monitor of the service
+
+        player: PrefetchPlayer of the service
+
+    Returns:
+        None
+
+    Raises:
+        None
+    """
+    # Reading the season and episode of the played media through the same
+    # xbmc.Player().getVideoInfoTag() calls as the auto search
+    metadata = service.get_player_metadata()
+    if not (metadata and metadata['tvshow'] and metadata['season'] and metadata['episode']):
+        return
+
+    episodes = service.get_setting_int('prefetch_episodes', 2)
+    delay = service.get_setting_int('prefetch_delay', 10)
+    with_download = service.get_setting_bool('prefetch_downloads')
+    preferred_languages = service.get_subtitle_languages()
+
+    for offset in range(1, episodes + 1):
+        if player.started or not player.isPlayingVideo():
+            break
+
+        found = service.prefetch_episode(
+            dict(metadata, episode=metadata['episode'] + offset),
+            preferred_languages,
+            with_download
+        )
+
+        # No further request is sent to https://feliratok.eu during the
+        # maintenance
+        if found is None:
+            break
+
+        if monitor.waitForAbort(delay):
+            break
+
+    # The idle connections are not kept open until the next playback
+    service.get_client().close()
+
+
+if __name__ == '__main__':
+    monitor = xbmc.Monitor()
+    player = PrefetchPlayer()
+
+    while not monitor.waitForAbort(1):
+        if not player.started:
+            continue
+        player.started = False
+
+        if not service.get_setting_bool('prefetch'):
+            continue
+
+        # Waiting for the playback to settle, thus the prefetch doesn't
+        # compete with the buffering of the stream
+        if monitor.waitForAbort(service.get_setting_int('prefetch_delay', 10)):
+            break
+
+        prefetch_next_episodes(monitor, player)
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helper modules of the Babel subtitle addon
+"""
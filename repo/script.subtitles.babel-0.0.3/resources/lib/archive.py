@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+Handling of the zipped and rared subtitles
+
+https://feliratok.eu serves the season packs as zip or rar archives. The type
+of the downloaded file is recognized by its first bytes. A zip archive is
+opened from the disk, only its central directory is read and only the
+subtitle of the played episode is extracted in chunks, thus the archive is
+never held in memory. The rar archives are opened by the archive support of
+Kodi (see service.py). 'zipfile' (and the compression modules it loads) is
+imported by the zip functions only, thus a plain subtitle download doesn't
+pay for it.
+"""
+
+import os
+
+from resources.lib.ranking import find_episode
+
+# Number of bytes extracted from an archive at once
+CHUNK_SIZE = 16 * 1024
+
+# First bytes of the supported archive types
+SIGNATURES = {
+    'zip': (b'PK\x03\x04', b'PK\x05\x06'),
+    'rar': (b'Rar!\x1a\x07',),
+}
+
+# Extensions of the subtitle files that can be extracted from an archive
+SUBTITLE_EXTENSIONS = ('.srt', '.sub', '.ass', '.ssa', '.vtt', '.smi')
+
+
+def sniff(head):
+    """
+    Recognizes the type of a downloaded file by its first bytes
+
+    Args:
+        head: The first bytes of the file (at least 7)
+
+    Returns:
+        string: 'zip', 'rar' or None if the file is not an archive
+
+    Raises:
+        None
+    """
+    for archive_type, signatures in SIGNATURES.items():
+        if head.startswith(signatures):
+            return archive_type
+
+    return None
+
+
+def choose_subtitle(names, season=0, episode=0):
+    """
+    Chooses the subtitle of the played episode from the file names of an archive
+
+    Args:
+        names: Names of the files of the archive
+
+        season: Season number of the played episode, 0 if unknown
+
+        episode: Episode number of the played episode, 0 if unknown
+
+    Returns:
+        string: Name of the chosen subtitle or None if the archive has no subtitle
+
+    Raises:
+        None
+    """
+    subtitles = [name for name in names if name.lower().endswith(SUBTITLE_EXTENSIONS)]
+    if len(subtitles) < 2:
+        return subtitles[0] if subtitles else None
+
+    if season and episode:
+        for name in subtitles:
+            if find_episode(os.path.basename(name)) == (season, episode):
+                return name
+
+    # Without a matching episode the first subtitle is the best guess, as
+    # the season packs list the episodes in order
+    return sorted(subtitles)[0]
+
+
+def list_zip(archive_path):
+    """
+    Lists the files of a zip archive. Only the central directory at the end of the archive is read
+
+    Args:
+        archive_path: Path of the zip archive on the disk
+
+    Returns:
+        list: Names of the files of the archive
+
+    Raises:
+        zipfile.BadZipFile: If the archive is corrupted
+
+        OSError: If the archive can't be read
+    """
+    import zipfile
+
+    with zipfile.ZipFile(archive_path) as archive:
+        return [info.filename for info in archive.infolist() if not info.is_dir()]
+
+
+def extract_zip_file(archive_path, name, target, chunk_size=CHUNK_SIZE):
+    """
+    Extracts one file of a zip archive in chunks
+
+    Args:
+        archive_path: Path of the zip archive on the disk
+
+        name: Name of the extracted file
+
+        target: File-like object with a write() method the file is written to
+
+        chunk_size: Number of bytes extracted at once
+
+    Returns:
+        int: Number of the extracted bytes
+
+    Raises:
+        zipfile.BadZipFile: If the archive is corrupted
+
+        OSError: If the archive can't be read
+    """
+    import zipfile
+
+    size = 0
+
+    with zipfile.ZipFile(archive_path) as archive, archive.open(name) as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            target.write(chunk)
+            size += len(chunk)
+
+    return size
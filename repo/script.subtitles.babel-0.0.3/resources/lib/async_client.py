@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+"""
+Small asyncio HTTP/1.1 client of the addon
+
+The client is built on 'asyncio.open_connection' of the standard library (TLS
+included), thus no dependency installation is required. Like HttpClient it
+keeps the connections of every host in a pool and reuses them, but the
+requests run as coroutines of one event loop instead of worker threads. The
+response bodies can be read in chunks as they arrive from the socket, and
+the 'chunked' transfer coding and the gzip and deflate content codings are
+decoded.
+
+A client belongs to the event loop it was created in, thus it's created and
+closed inside the coroutine that uses it.
+"""
+
+import asyncio
+import email.parser
+import http.client
+import zlib
+from urllib.parse import urljoin, urlsplit
+
+from resources.lib.http_client import CHUNK_SIZE, MAX_REDIRECTS, REDIRECT_CODES, HttpError, get_decompressor, get_ssl_context
+from resources.lib.profiling import Profiler
+
+# Maximum size of the status line and the headers of a response
+MAX_HEADER_SIZE = 64 * 1024
+
+
+class AsyncHttpResponse:
+    """
+    Response of a request whose body can be read at once or in chunks as it arrives from the socket. The connection goes back to the pool of the client once the body is read completely.
+
+    Args:
+        client: The AsyncHttpClient that executed the request
+
+        key: (scheme, host) pair of the connection
+
+        connection: (reader, writer) pair of the connection on which the response arrives
+
+        status: Status code of the response
+
+        reason: Reason phrase of the response
+
+        headers: Headers of the response (http.client.HTTPMessage)
+
+        url: Final URL of the response, after following the redirections
+    """
+
+    def __init__(self, client, key, connection, status, reason, headers, url):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = None
+        self._client = client
+        self._key = key
+        self._connection = connection
+
+    @property
+    def will_close(self):
+        """
+        True if the server closes the connection after the response
+        """
+        return (self.headers.get('Connection') or '').lower() == 'close'
+
+    async def _read(self, size):
+        """
+        Reads at most 'size' bytes of the raw body from the socket
+        """
+        reader = self._connection[0]
+        with self._client.profiler.span('body'):
+            return await asyncio.wait_for(reader.read(size), self._client.timeout)
+
+    async def _read_exactly(self, size):
+        reader = self._connection[0]
+        with self._client.profiler.span('body'):
+            return await asyncio.wait_for(reader.readexactly(size), self._client.timeout)
+
+    async def _read_line(self):
+        reader = self._connection[0]
+        return await asyncio.wait_for(reader.readline(), self._client.timeout)
+
+    async def _iter_raw(self, chunk_size):
+        """
+        Yields the raw (still compressed) body based on its framing: 'chunked' transfer coding, 'Content-Length' or the end of the connection
+        """
+        if self.status in (204, 304) or 100 <= self.status < 200:
+            return
+
+        if 'chunked' in (self.headers.get('Transfer-Encoding') or '').lower():
+            while True:
+                size_line = await self._read_line()
+                if not size_line:
+                    raise http.client.IncompleteRead(b'')
+                size = int(size_line.split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    # Skipping the trailer headers
+                    while (await self._read_line()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                while size:
+                    data = await self._read(min(size, chunk_size))
+                    if not data:
+                        raise http.client.IncompleteRead(b'')
+                    size -= len(data)
+                    yield data
+                await self._read_exactly(2)
+
+        length = self.headers.get('Content-Length')
+        if length is not None:
+            remaining = int(length)
+            while remaining:
+                data = await self._read(min(remaining, chunk_size))
+                if not data:
+                    raise http.client.IncompleteRead(b'', remaining)
+                remaining -= len(data)
+                yield data
+            return
+
+        # Without framing the body ends with the connection
+        while True:
+            data = await self._read(chunk_size)
+            if not data:
+                self._connection[1].close()
+                self._connection = None
+                return
+            yield data
+
+    async def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Yields the decompressed body in chunks as it arrives from the socket
+
+        Args:
+            chunk_size: Number of bytes read from the socket at once
+
+        Returns:
+            Asynchronous generator of bytes
+
+        Raises:
+            OSError: If the connection fails (asyncio.TimeoutError also)
+        """
+        decompressor = get_decompressor(self.headers.get('Content-Encoding'))
+        first_chunk = True
+
+        try:
+            async for chunk in self._iter_raw(chunk_size):
+                if decompressor is not None:
+                    try:
+                        chunk = decompressor.decompress(chunk)
+                    except zlib.error:
+                        # Some servers send raw deflate data without the zlib
+                        # header, it can be recognized on the first chunk
+                        if not first_chunk or self.headers.get('Content-Encoding', '').lower() != 'deflate':
+                            raise
+                        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                        chunk = decompressor.decompress(chunk)
+                first_chunk = False
+                if chunk:
+                    yield chunk
+
+            if decompressor is not None:
+                chunk = decompressor.flush()
+                if chunk:
+                    yield chunk
+        except BaseException:
+            # The body was not read completely (error or the reader stopped
+            # early), thus the connection can't be reused
+            self.close()
+            raise
+
+        self._finish()
+
+    async def read(self):
+        """
+        Reads and returns the whole decompressed body. The body is stored in the 'body' attribute also
+
+        Returns:
+            bytes: The decompressed body
+
+        Raises:
+            OSError: If the connection fails (asyncio.TimeoutError also)
+        """
+        if self.body is None:
+            self.body = b''.join([chunk async for chunk in self.iter_chunks()])
+        return self.body
+
+    def _finish(self):
+        """
+        Hands back the connection to the client after the body was read
+        """
+        if self._connection is None:
+            return
+        if self.will_close:
+            self._connection[1].close()
+        else:
+            self._client._release(self._key, self._connection)
+        self._connection = None
+
+    def close(self):
+        """
+        Closes the connection if the body was not read completely
+        """
+        if self._connection is not None:
+            self._connection[1].close()
+            self._connection = None
+
+
+class AsyncHttpClient:
+    """
+    Asyncio HTTP/1.1 client with a per host pool of persistent (keep-alive) connections
+
+    Args:
+        headers: Headers sent with every request (e.g. the User-Agent)
+
+        timeout: Timeout of the connection and of every read in seconds
+
+        profiler: Profiler that records the 'connect' (DNS lookup, TCP and TLS handshake), 'ttfb' (time to first byte) and 'body' spans of the requests
+
+        scheduler: RequestScheduler that rate limits and repeats the requests (see scheduler.py). Optional
+    """
+
+    def __init__(self, headers=None, timeout=30, profiler=None, scheduler=None):
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.profiler = profiler or Profiler()
+        self.scheduler = scheduler
+        self._idle = dict()
+
+    async def _open(self, scheme, host):
+        """
+        Opens a new connection to the host
+        """
+        parts = urlsplit(f'{scheme}://{host}')
+        port = parts.port or (443 if scheme == 'https' else 80)
+
+        with self.profiler.span('connect'):
+            return await asyncio.wait_for(
+                asyncio.open_connection(
+                    parts.hostname,
+                    port,
+                    ssl=get_ssl_context() if scheme == 'https' else None
+                ),
+                self.timeout
+            )
+
+    async def _acquire(self, key):
+        """
+        Returns an idle connection of the host from the pool or opens a new one. The second item of the returned tuple is True if the connection was reused.
+        """
+        connections = self._idle.get(key)
+        while connections:
+            connection = connections.pop()
+            # The server may have closed the idle connection already
+            if not connection[0].at_eof():
+                return connection, True
+            connection[1].close()
+
+        return await self._open(*key), False
+
+    def _release(self, key, connection):
+        """
+        Puts the connection back into the pool for the upcoming requests
+        """
+        self._idle.setdefault(key, list()).append(connection)
+
+    async def _exchange(self, connection, request):
+        """
+        Sends the request on the connection and reads the status line and the headers of the response. The connection is closed if anything goes wrong.
+        """
+        reader, writer = connection
+        try:
+            with self.profiler.span('ttfb'):
+                writer.write(request)
+                await writer.drain()
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.timeout)
+        except asyncio.IncompleteReadError as error:
+            writer.close()
+            raise http.client.RemoteDisconnected('Remote end closed connection without response') from error
+        except asyncio.LimitOverrunError as error:
+            writer.close()
+            raise http.client.LineTooLong('header line') from error
+        except BaseException:
+            writer.close()
+            raise
+
+        if len(head) > MAX_HEADER_SIZE:
+            writer.close()
+            raise http.client.LineTooLong('headers')
+
+        status_line, _, header_block = head.partition(b'\r\n')
+        try:
+            version, status, reason = (status_line.decode('iso-8859-1').split(' ', 2) + [''])[:3]
+            status = int(status)
+        except ValueError:
+            writer.close()
+            raise http.client.BadStatusLine(status_line)
+        if not version.startswith('HTTP/'):
+            writer.close()
+            raise http.client.BadStatusLine(status_line)
+
+        headers = email.parser.BytesParser(_class=http.client.HTTPMessage).parsebytes(header_block)
+        return status, reason.strip(), headers
+
+    async def _send(self, url, headers):
+        """
+        Executes one GET request without following the redirections. The body of the response is not read.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = {'Host': parts.netloc}
+        request_headers.update(self.headers)
+        request_headers['Accept-Encoding'] = 'gzip, deflate'
+        request_headers['Connection'] = 'keep-alive'
+        request_headers.update(headers or {})
+
+        lines = [f'GET {path} HTTP/1.1'] + [f'{name}: {value}' for name, value in request_headers.items()]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1')
+
+        connection, reused = await self._acquire(key)
+        try:
+            status, reason, response_headers = await self._exchange(connection, request)
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # The server may close an idle keep-alive connection at any time,
+            # in this case the request is repeated once on a new connection
+            if not reused:
+                raise
+            connection = await self._open(*key)
+            status, reason, response_headers = await self._exchange(connection, request)
+
+        return AsyncHttpResponse(self, key, connection, status, reason, response_headers, url)
+
+    async def open(self, url, headers=None):
+        """
+        Sends a GET request to the given URL and returns the response without reading its body. Redirections are followed. If the client has a scheduler the request is rate limited and the failed attempts are repeated
+
+        Args:
+            url: URL to download
+
+            headers: Extra headers of the request
+
+        Returns:
+            AsyncHttpResponse: The response whose body can be read in chunks with iter_chunks()
+
+        Raises:
+            HttpError: If the server responds with an error status code
+
+            OSError: If the connection fails (http.client.HTTPException and asyncio.TimeoutError also)
+
+            CircuitOpenError: If the scheduler refuses the request during the maintenance of the website
+        """
+        if self.scheduler is None:
+            return await self._request(url, headers)
+
+        async def request(remaining):
+            # The deadline covers the connection and the headers of the
+            # response, the body is read with the timeout of the client
+            return await asyncio.wait_for(self._request(url, headers), min(self.timeout, remaining))
+
+        return await self.scheduler.run_async(request)
+
+    async def _request(self, url, headers):
+        """
+        Executes the request of open() once
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._send(url, headers)
+
+            location = response.headers.get('Location')
+            if response.status in REDIRECT_CODES and location:
+                # The body of the redirection is read to reuse the connection
+                await response.read()
+                url = urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                await response.read()
+                raise HttpError(url, response.status, response.reason)
+
+            return response
+
+        raise HttpError(url, response.status, 'Too many redirections')
+
+    async def get(self, url, headers=None):
+        """
+        Downloads the given URL. Redirections are followed and the compressed bodies are decoded
+
+        Args:
+            url: URL to download
+
+            headers: Extra headers of the request
+
+        Returns:
+            AsyncHttpResponse: The response with the decoded body in its 'body' attribute
+
+        Raises:
+            HttpError: If the server responds with an error status code
+
+            OSError: If the connection fails (http.client.HTTPException and asyncio.TimeoutError also)
+        """
+        response = await self.open(url, headers)
+        await response.read()
+        return response
+
+    def close(self):
+        """
+        Closes every idle connection of the pool
+        """
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
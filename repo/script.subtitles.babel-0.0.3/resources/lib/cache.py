@@ -0,0 +1,604 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent on-disk caches of the addon
+
+SearchCache is a single JSON file in the addon data folder. Every entry is
+keyed by the normalized query parameters of the search and holds the parsed
+(lang, title, download_link) tuples of all result pages. Entries expire after
+a configurable time (TTL) and the least recently used entries are evicted when
+the cache grows over its size limit.
+
+PageCache keeps the validators (ETag and Last-Modified headers) of the result
+pages next to their parsed rows. An expired search is revalidated page by page
+with conditional requests, and a '304 Not Modified' response reuses the rows
+without downloading and parsing the page again. Both share the JSON file
+handling of JsonFileCache.
+
+DownloadCache stores the downloaded subtitle files by the hash of their
+content, thus a repeated download is a local file copy. The files can be
+written chunk by chunk while they are downloading with a CacheWriter. Its
+index is shared by the plugin and the prefetch service, thus every change is
+merged into the index on the disk under a lock file.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds a lock file of the download cache is waited for, and the age after
+# which it's considered left behind by a killed process
+LOCK_TIMEOUT = 5
+STALE_LOCK_AGE = 30
+
+# Name of a stored file of the download cache: the SHA-1 hash of its content
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+# Version of the format of the cached rows. Entries written in an other format
+# are ignored
+FORMAT_VERSION = 2
+
+
+def normalize_query(http_query_params, languages=()):
+    """
+    Creates a cache key from the query parameters of a search. The 'page' parameter is left out as the cache holds the result of every page, and the search terms are lowercased and their whitespaces are collapsed, thus 'The  Office' and 'the office' share the same entry
+
+    Args:
+        http_query_params: Dict of the query string parameters of the search
+
+        languages: Languages the result is filtered to after the download (see service.find_matches()), they are part of the key. Optional
+
+    Returns:
+        string: The normalized cache key
+
+    Raises:
+        None
+    """
+    normalized = dict()
+    for key, value in http_query_params.items():
+        if key == 'page':
+            continue
+        normalized[key] = ' '.join(str(value).lower().split())
+
+    if languages:
+        normalized['languages'] = sorted(languages)
+
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+
+def write_json_atomic(path, data):
+    """
+    Writes a JSON file in one step: the data is written into a temporary file which replaces the file, thus a parallel plugin invocation or the prefetch service never reads a half written file
+
+    Args:
+        path: Path of the JSON file
+
+        data: The JSON serializable data
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If the file can't be written
+    """
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class JsonFileCache:
+    """
+    Base of the caches whose entries are stored in one JSON file. The file is read on the first use and written once by save(), the entries are guarded by a lock, thus the threads of a search can share the cache
+
+    Args:
+        path: Path of the JSON file of the cache
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """
+        Loads the entries from the cache file. A missing or corrupted file results an empty cache.
+        """
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = dict()
+
+        return self._entries
+
+    def save(self):
+        """
+        Writes the entries into the cache file if they changed. A failing write only means a cache miss later
+        """
+        with self._lock:
+            if not self._changed:
+                return
+
+            try:
+                write_json_atomic(self.path, self._entries)
+                self._changed = False
+            except OSError:
+                pass
+
+
+class SearchCache(JsonFileCache):
+    """
+    Size bounded LRU cache of search results with expiration, stored in a JSON file. It's thread safe, thus the parallel queries of a search can share it, and it's written once by save() at the end of the search
+
+    Args:
+        path: Path of the JSON file of the cache
+
+        ttl: Lifetime of an entry in seconds. 0 disables the cache
+
+        max_entries: Maximum number of entries kept in the cache
+    """
+
+    def __init__(self, path, ttl, max_entries):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key):
+        """
+        Returns the cached rows of the given key
+
+        Args:
+            key: Cache key created by normalize_query()
+
+        Returns:
+            list: List of the (lang, title, download_link) tuples or None if the key is not cached or it's expired
+
+        Raises:
+            None
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None or entry.get('format') != FORMAT_VERSION:
+                return None
+
+            now = time.time()
+            if now - entry['created'] > self.ttl:
+                del entries[key]
+                self._changed = True
+                return None
+
+            # Refreshing the access time keeps the entry at the end of the
+            # LRU order
+            entry['accessed'] = now
+            self._changed = True
+
+            return [tuple(row) for row in entry['rows']]
+
+    def put(self, key, rows):
+        """
+        Stores the rows of the given key and evicts the least recently used entries if the cache is full
+
+        Args:
+            key: Cache key created by normalize_query()
+
+            rows: List of the (lang, title, download_link) tuples
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            entries = self._load()
+            now = time.time()
+            entries[key] = {
+                'format': FORMAT_VERSION,
+                'created': now,
+                'accessed': now,
+                'rows': [list(row) for row in rows]
+            }
+
+            # Dropping the expired entries first, then the least recently
+            # used ones
+            for cached_key in [k for k, v in entries.items() if now - v['created'] > self.ttl]:
+                del entries[cached_key]
+
+            if len(entries) > self.max_entries:
+                lru_order = sorted(entries, key=lambda k: entries[k]['accessed'])
+                for cached_key in lru_order[:len(entries) - self.max_entries]:
+                    del entries[cached_key]
+
+            self._changed = True
+
+
+class PageCache(JsonFileCache):
+    """
+    Size bounded LRU cache of the validators and the parsed rows of the result pages, stored in a JSON file. It's thread safe, thus the worker threads of the page downloads can share it, and it's written once by save() at the end of the search
+
+    Args:
+        path: Path of the JSON file of the cache
+
+        max_entries: Maximum number of pages kept in the cache. 0 disables the cache
+    """
+
+    def __init__(self, path, max_entries):
+        super().__init__(path)
+        self.max_entries = max_entries
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, url):
+        """
+        Returns the cached entry of a result page
+
+        Args:
+            url: URL of the result page
+
+        Returns:
+            dict: The 'etag', 'last_modified', 'rows' (list of (lang, title, download_link) tuples) and 'pages' (number of result pages or None) values of the page or None if the page is not cached
+
+        Raises:
+            None
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._load().get(url)
+            if entry is None or entry.get('format') != FORMAT_VERSION:
+                return None
+
+            entry['accessed'] = time.time()
+            self._changed = True
+
+            return {
+                'etag': entry['etag'],
+                'last_modified': entry['last_modified'],
+                'rows': [tuple(row) for row in entry['rows']],
+                'pages': entry['pages'],
+            }
+
+    def put(self, url, response_headers, rows, pages):
+        """
+        Stores the parsed rows of a result page if the response has a validator (ETag or Last-Modified header)
+
+        Args:
+            url: URL of the result page
+
+            response_headers: Headers of the response of the page
+
+            rows: List of the (lang, title, download_link) tuples of the page
+
+            pages: Number of result pages found on the page or None
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not self.enabled or not (etag or last_modified):
+            return
+
+        with self._lock:
+            entries = self._load()
+            entries[url] = {
+                'format': FORMAT_VERSION,
+                'etag': etag,
+                'last_modified': last_modified,
+                'accessed': time.time(),
+                'rows': [list(row) for row in rows],
+                'pages': pages,
+            }
+
+            if len(entries) > self.max_entries:
+                lru_order = sorted(entries, key=lambda k: entries[k]['accessed'])
+                for cached_url in lru_order[:len(entries) - self.max_entries]:
+                    del entries[cached_url]
+
+            self._changed = True
+
+
+def conditional_headers(entry):
+    """
+    Creates the headers of a conditional request from a cached page
+
+    Args:
+        entry: Entry of the page returned by PageCache.get() or None
+
+    Returns:
+        dict: The 'If-None-Match' and 'If-Modified-Since' headers based on the validators of the page, empty if the page is not cached
+
+    Raises:
+        None
+    """
+    headers = dict()
+    if entry is None:
+        return headers
+
+    if entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    return headers
+
+
+class DownloadCache:
+    """
+    Content-addressed store of the downloaded subtitle files with a size limit and LRU eviction
+
+    Every file is stored once, named by the SHA-1 hash of its content, and an
+    index (JSON file) maps the download URLs to the hashes. Several URLs
+    serving the same file share the stored copy. The index is read again and
+    changed under a lock file, thus the changes of the plugin and of the
+    prefetch service are not lost, and a stored file without an index entry
+    is removed by the eviction.
+
+    Args:
+        folder: Folder of the stored files and of the index
+
+        max_bytes: Maximum total size of the stored files. 0 disables the cache
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(folder, 'index.json')
+        self.lock_path = os.path.join(folder, 'index.lock')
+        self._index = None
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _load(self):
+        """
+        Loads the index from the disk. A missing or corrupted index results an empty cache.
+        """
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = dict()
+
+        return self._index
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the lock file of the index while the index is read, changed and saved.
+
+        Raises:
+            OSError: If the lock can't be taken in LOCK_TIMEOUT seconds
+        """
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_AGE:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise OSError(f'Download cache is locked: {self.lock_path}')
+                time.sleep(0.05)
+
+        try:
+            os.close(fd)
+            yield self._load()
+        finally:
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def _save(self):
+        """
+        Writes the index in one step, a failing write only means a cache miss later.
+        """
+        try:
+            write_json_atomic(self.index_path, self._index)
+        except OSError:
+            pass
+
+    def _path(self, digest):
+        return os.path.join(self.folder, digest)
+
+    def get(self, url):
+        """
+        Returns the stored file of the given download URL
+
+        Args:
+            url: Download URL of the subtitle
+
+        Returns:
+            string: Path of the stored file or None if the URL is not cached
+
+        Raises:
+            None
+        """
+        if not self.enabled or not os.path.exists(self.index_path):
+            return None
+
+        try:
+            with self._locked() as index:
+                entry = index.get(url)
+                if entry is None:
+                    return None
+
+                path = self._path(entry['hash'])
+                if not os.path.exists(path):
+                    del index[url]
+                    self._save()
+                    return None
+
+                entry['accessed'] = time.time()
+                self._save()
+        except OSError:
+            return None
+
+        return path
+
+    def writer(self, url):
+        """
+        Creates a writer that stores a file of the given URL chunk by chunk while it's downloading. The file becomes part of the cache by the commit() method of the writer
+
+        Args:
+            url: Download URL of the subtitle
+
+        Returns:
+            CacheWriter: The writer of the file
+
+        Raises:
+            OSError: If the cache folder can't be created
+        """
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        return CacheWriter(self, url)
+
+    def _add(self, url, temp_path, digest, size):
+        """
+        Moves a written file to its content-addressed place and adds it to the index. Returns the path of the stored file.
+        """
+        with self._locked() as index:
+            path = self._path(digest)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, path)
+
+            index[url] = {'hash': digest, 'size': size, 'accessed': time.time()}
+            self._evict()
+            self._save()
+
+        return path
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the stored files fit in the size limit. A file is deleted when no URL refers to it anymore, the stored files without an index entry (e.g. left behind by a crash) are deleted also.
+        """
+        index = self._index
+
+        referenced = {entry['hash'] for entry in index.values()}
+        for name in os.listdir(self.folder):
+            if DIGEST_PATTERN.match(name) and name not in referenced:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+        def total_size():
+            return sum({entry['hash']: entry['size'] for entry in index.values()}.values())
+
+        for url in sorted(index, key=lambda u: index[u]['accessed']):
+            if total_size() <= self.max_bytes:
+                break
+
+            digest = index.pop(url)['hash']
+            if not any(entry['hash'] == digest for entry in index.values()):
+                try:
+                    os.remove(self._path(digest))
+                except OSError:
+                    pass
+
+
+class CacheWriter:
+    """
+    Writes a file into the DownloadCache chunk by chunk and computes its hash on the fly, thus the file is never held in memory
+
+    Args:
+        cache: The DownloadCache the file belongs to
+
+        url: Download URL of the subtitle
+    """
+
+    def __init__(self, cache, url):
+        self.cache = cache
+        self.url = url
+        self.size = 0
+        self.path = os.path.join(cache.folder, f'{os.getpid()}.{id(self)}.tmp')
+        self._hash = hashlib.sha1()
+        self._file = open(self.path, 'wb')
+
+    def write(self, chunk):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        """
+        Closes the written file, thus it can be read before it's committed
+        """
+        self._file.close()
+
+    def commit(self):
+        """
+        Adds the written file to the cache. Files larger than the size limit of the cache are dropped
+
+        Returns:
+            string: Path of the stored file or None if the file couldn't be stored
+
+        Raises:
+            None
+        """
+        self.close()
+
+        if self.size > self.cache.max_bytes:
+            self.discard()
+            return None
+
+        try:
+            return self.cache._add(self.url, self.path, self._hash.hexdigest(), self.size)
+        except OSError:
+            self.discard()
+            return None
+
+    def discard(self):
+        """
+        Deletes the written file
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
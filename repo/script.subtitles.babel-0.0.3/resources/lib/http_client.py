@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+"""
+Small HTTP client of the addon that keeps the connections alive
+
+'urllib.request.urlopen' opens a new TCP connection (and does a new TLS
+handshake) for every call. This client keeps the connections of every host in
+a pool and reuses them across the result pages and the subtitle downloads of
+one plugin invocation. The pool is thread safe, thus the parallel page
+downloads can share it also.
+"""
+
+import http.client
+import socket
+import ssl
+import threading
+import time
+import zlib
+from urllib.parse import urljoin, urlsplit
+
+from resources.lib.profiling import Profiler
+
+# Maximum number of redirections followed before giving up
+MAX_REDIRECTS = 5
+
+# Status codes of the responses that are redirections
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# Number of bytes read from the socket at once while streaming a body
+CHUNK_SIZE = 16 * 1024
+
+# TLS context shared by the clients. Loading the certificates takes tens of
+# milliseconds, thus it's done once and only if a https URL is requested
+_ssl_context = None
+
+
+def get_ssl_context():
+    """
+    Returns the shared TLS context of the clients, it's created on the first call
+
+    Returns:
+        ssl.SSLContext: The default TLS context
+
+    Raises:
+        None
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+class HttpError(Exception):
+    """
+    Raised if the server responds with an error status code (4xx or 5xx)
+    """
+
+    def __init__(self, url, status, reason):
+        super().__init__(f"HTTP Error {status}: {reason} ({url})")
+        self.url = url
+        self.status = status
+        self.reason = reason
+
+
+def get_decompressor(content_encoding):
+    """
+    Creates an incremental decompressor based on the 'Content-Encoding' header of a response
+
+    Args:
+        content_encoding: Value of the 'Content-Encoding' header or None
+
+    Returns:
+        zlib.Decompress object or None if the body is not compressed
+
+    Raises:
+        None
+    """
+    encoding = (content_encoding or '').strip().lower()
+
+    if encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return zlib.decompressobj()
+
+    return None
+
+
+class HttpResponse:
+    """
+    Response of a request whose body can be read at once or in chunks as it arrives from the socket. The connection goes back to the pool of the client once the body is read completely.
+
+    Args:
+        client: The HttpClient that executed the request
+
+        key: (scheme, host) pair of the connection
+
+        connection: The connection on which the response arrives
+
+        response: The http.client.HTTPResponse object
+
+        url: Final URL of the response, after following the redirections
+
+        profiler: Profiler that records the time of the body read ('body' span)
+    """
+
+    def __init__(self, client, key, connection, response, url, profiler):
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.body = None
+        self._client = client
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self._profiler = profiler
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Yields the decompressed body in chunks as it arrives from the socket
+
+        Args:
+            chunk_size: Number of bytes read from the socket at once
+
+        Returns:
+            Generator of bytes
+
+        Raises:
+            OSError: If the connection fails
+        """
+        decompressor = get_decompressor(self.headers.get('Content-Encoding'))
+        first_chunk = True
+
+        try:
+            while True:
+                with self._profiler.span('body'):
+                    chunk = self._response.read(chunk_size)
+                if not chunk:
+                    break
+                if decompressor is not None:
+                    try:
+                        chunk = decompressor.decompress(chunk)
+                    except zlib.error:
+                        # Some servers send raw deflate data without the zlib
+                        # header, it can be recognized on the first chunk
+                        if not first_chunk or self.headers.get('Content-Encoding', '').lower() != 'deflate':
+                            raise
+                        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                        chunk = decompressor.decompress(chunk)
+                first_chunk = False
+                if chunk:
+                    yield chunk
+
+            if decompressor is not None:
+                chunk = decompressor.flush()
+                if chunk:
+                    yield chunk
+        except BaseException:
+            # The body was not read completely (error or the reader stopped
+            # early), thus the connection can't be reused
+            self.close()
+            raise
+
+        self._finish()
+
+    def read(self):
+        """
+        Reads and returns the whole decompressed body. The body is stored in the 'body' attribute also
+
+        Returns:
+            bytes: The decompressed body
+
+        Raises:
+            OSError: If the connection fails
+        """
+        if self.body is None:
+            self.body = b''.join(self.iter_chunks())
+        return self.body
+
+    def _finish(self):
+        """
+        Hands back the connection to the client after the body was read
+        """
+        if self._connection is None:
+            return
+        if self._response.will_close:
+            self._connection.close()
+        else:
+            self._client._release(self._key, self._connection)
+        self._connection = None
+
+    def close(self):
+        """
+        Closes the connection if the body was not read completely
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _ProfiledConnection:
+    """
+    Mixin of the connection classes that records the DNS lookup ('dns' span) and the TCP and TLS handshake ('connect' span) of the connection
+    """
+
+    def __init__(self, *args, profiler, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profiler = profiler
+        self._dns_seconds = 0.0
+        self._create_connection = self._resolve_and_connect
+
+    def _resolve_and_connect(self, address, timeout=None, source_address=None):
+        """
+        Replacement of 'socket.create_connection' that measures the DNS lookup separately
+        """
+        host, port = address
+        start = time.perf_counter()
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        self._dns_seconds = time.perf_counter() - start
+        self.profiler.add('dns', self._dns_seconds)
+
+        error = None
+        for _, _, _, _, sockaddr in addresses:
+            try:
+                return socket.create_connection(sockaddr[:2], timeout, source_address)
+            except OSError as exc:
+                error = exc
+
+        raise error or OSError(f"getaddrinfo returns an empty list for {host}")
+
+    def connect(self):
+        self._dns_seconds = 0.0
+        start = time.perf_counter()
+        super().connect()
+        self.profiler.add('connect', time.perf_counter() - start - self._dns_seconds)
+
+
+class _ProfiledHTTPConnection(_ProfiledConnection, http.client.HTTPConnection):
+    pass
+
+
+class _ProfiledHTTPSConnection(_ProfiledConnection, http.client.HTTPSConnection):
+    pass
+
+
+class HttpClient:
+    """
+    HTTP client with a per host pool of persistent (keep-alive) connections
+
+    Args:
+        headers: Headers sent with every request (e.g. the User-Agent)
+
+        timeout: Socket timeout of the connections in seconds
+
+        profiler: Profiler that records the 'dns', 'connect' (TCP and TLS handshake), 'ttfb' (time to first byte) and 'body' spans of the requests
+
+        scheduler: RequestScheduler that rate limits and repeats the requests (see scheduler.py). Optional
+    """
+
+    def __init__(self, headers=None, timeout=30, profiler=None, scheduler=None):
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.profiler = profiler or Profiler()
+        self.scheduler = scheduler
+        self._idle = dict()
+        self._lock = threading.Lock()
+
+    def _open(self, scheme, host):
+        """
+        Creates a new connection to the host. The connection is established by the first request.
+        """
+        if self.profiler.enabled:
+            if scheme == 'https':
+                return _ProfiledHTTPSConnection(host, timeout=self.timeout, context=get_ssl_context(), profiler=self.profiler)
+            return _ProfiledHTTPConnection(host, timeout=self.timeout, profiler=self.profiler)
+
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, timeout=self.timeout, context=get_ssl_context())
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def _acquire(self, key):
+        """
+        Returns an idle connection of the host from the pool or opens a new one. The second item of the returned tuple is True if the connection was reused.
+        """
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+
+        return self._open(*key), False
+
+    def _release(self, key, connection):
+        """
+        Puts the connection back into the pool for the upcoming requests
+        """
+        with self._lock:
+            self._idle.setdefault(key, list()).append(connection)
+
+    @staticmethod
+    def _set_timeout(connection, timeout):
+        """
+        Applies the socket timeout of the request to a new or a reused connection
+        """
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+
+    def _exchange(self, connection, path, headers):
+        """
+        Sends the request on the connection and waits for the status line and the headers of the response. The connection is closed if anything goes wrong.
+        """
+        try:
+            # Connecting explicitly separates the TCP and TLS handshake from
+            # the time to first byte
+            if connection.sock is None:
+                connection.connect()
+
+            with self.profiler.span('ttfb'):
+                connection.request('GET', path, headers=headers)
+                return connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+
+    def _send(self, url, headers, timeout):
+        """
+        Executes one GET request without following the redirections. The body of the response is not read.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = dict(self.headers)
+        request_headers['Accept-Encoding'] = 'gzip, deflate'
+        request_headers['Connection'] = 'keep-alive'
+        request_headers.update(headers or {})
+
+        connection, reused = self._acquire(key)
+        self._set_timeout(connection, timeout)
+        try:
+            response = self._exchange(connection, path, request_headers)
+        except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError):
+            # The server may close an idle keep-alive connection at any time,
+            # in this case the request is repeated once on a new connection
+            if not reused:
+                raise
+            connection = self._open(*key)
+            self._set_timeout(connection, timeout)
+            response = self._exchange(connection, path, request_headers)
+
+        return HttpResponse(self, key, connection, response, url, self.profiler)
+
+    def open(self, url, headers=None):
+        """
+        Sends a GET request to the given URL and returns the response without reading its body. Redirections are followed. If the client has a scheduler the request is rate limited and the failed attempts are repeated
+
+        Args:
+            url: URL to download
+
+            headers: Extra headers of the request
+
+        Returns:
+            HttpResponse: The response whose body can be read in chunks with iter_chunks()
+
+        Raises:
+            HttpError: If the server responds with an error status code
+
+            OSError: If the connection fails (http.client.HTTPException also)
+
+            CircuitOpenError: If the scheduler refuses the request during the maintenance of the website
+        """
+        if self.scheduler is None:
+            return self._request(url, headers, self.timeout)
+
+        return self.scheduler.run(lambda remaining: self._request(url, headers, min(self.timeout, remaining)))
+
+    def _request(self, url, headers, timeout):
+        """
+        Executes the request of open() once, with the given socket timeout
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._send(url, headers, timeout)
+
+            location = response.headers.get('Location')
+            if response.status in REDIRECT_CODES and location:
+                # The body of the redirection is read to reuse the connection
+                response.read()
+                url = urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                response.read()
+                raise HttpError(url, response.status, response.reason)
+
+            return response
+
+        raise HttpError(url, response.status, 'Too many redirections')
+
+    def get(self, url, headers=None):
+        """
+        Downloads the given URL. Redirections are followed and the compressed bodies are decoded
+
+        Args:
+            url: URL to download
+
+            headers: Extra headers of the request
+
+        Returns:
+            HttpResponse: The response with the decoded body in its 'body' attribute
+
+        Raises:
+            HttpError: If the server responds with an error status code
+
+            OSError: If the connection fails (http.client.HTTPException also)
+        """
+        response = self.open(url, headers)
+        response.read()
+        return response
+
+    def close(self):
+        """
+        Closes every idle connection of the pool
+        """
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parsers of the https://feliratok.eu result pages
+
+ResultPageParser is a streaming parser built on the 'html.parser' module of the
+standard library, thus no dependency installation is required. The HTML
+content can be fed in chunks as it arrives from the socket and the subtitle
+rows are available as soon as they are parsed. Only the unprocessed tail of the
+page and the current row are kept in memory, regardless of the size of the
+page.
+
+extract_rows() works on a page that is already in memory with the precompiled
+regular expressions of the PATTERNS registry. It parses the result pages 2..N,
+whose pagination block is not needed.
+"""
+
+import html
+import re
+from html.parser import HTMLParser
+
+# Content of the page returned by https://feliratok.eu during maintenance
+MAINTENANCE_TEXT = "Karbantartas, hamarosan jovunk vissza!"
+
+# Registry of the regular expressions used on the result pages. They are
+# compiled once, when the module is imported
+PATTERNS = {
+    # The flag, title and download URL of a subtitle row. The language can't
+    # contain tags and the title ends at the first '</div>', thus they are
+    # matched greedily instead of with lazy '.*?' spans that backtrack
+    'row': re.compile(
+        r'<tr id="vilagit"[^>]*>.*?<small>([^<]*)</small>.*?class="magyar">((?:[^<]|<(?!/div>))*)</div>.*?href="([^"]*?action=letolt[^"]*)"',
+        re.DOTALL
+    ),
+    # Any HTML tag
+    'tag': re.compile(r'<[^>]*>'),
+}
+
+
+def extract_rows(page):
+    """
+    Pulls the language, the cleaned title and the download link of every subtitle row from a result page in one pass. The result is the same as the one of ResultPageParser
+
+    Args:
+        page: HTML content of the result page
+
+    Returns:
+        list: List of the (lang, title, download_link) tuples
+
+    Raises:
+        None
+    """
+    tag_pattern = PATTERNS['tag']
+    rows = list()
+
+    for lang, title, link in PATTERNS['row'].findall(page):
+        # Most of the titles are plain text, only the others need cleaning
+        if '<' in title:
+            title = tag_pattern.sub('', title)
+        if '&' in title:
+            title = html.unescape(title)
+        link = link.replace('&amp;', '&')
+        rows.append((lang.strip(), title.strip(), link))
+
+    return rows
+
+
+class ResultPageParser(HTMLParser):
+    """
+    Collects the subtitle rows and the number of result pages from a result page
+
+    A subtitle row starts with a '<tr id="vilagit">' tag. The language is the
+    text of the first '<small>' tag of the row, the title is the text of the
+    '<div class="magyar">' tag and the download link is the first link that
+    contains 'action=letolt'. The number of result pages is the number of
+    links in the '<div class="pagination">' block.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # Parsed rows that were not collected by pop_rows() yet
+        self.rows = list()
+        # Number of result pages. None until the pagination block is parsed
+        self.pages = None
+        # The beginning of the page, used to recognize the maintenance page
+        self._head = ''
+        self._reset_row()
+        self._in_pagination = False
+        self._pagination_links = 0
+
+    def _reset_row(self):
+        self._in_row = False
+        self._lang = None
+        self._lang_parts = None
+        self._title = None
+        self._title_parts = None
+        self._title_depth = 0
+
+    @property
+    def maintenance(self):
+        """
+        True if the parsed content is the maintenance notice of the website
+        """
+        return self._head.strip() == MAINTENANCE_TEXT
+
+    def feed(self, data):
+        if len(self._head) <= len(MAINTENANCE_TEXT) * 2:
+            self._head += data[:len(MAINTENANCE_TEXT) * 2]
+        super().feed(data)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr' and ('id', 'vilagit') in attrs:
+            # A new row starts, a row without download link is dropped
+            self._reset_row()
+            self._in_row = True
+            return
+
+        if tag == 'div':
+            classes = (dict(attrs).get('class') or '').split()
+            if 'pagination' in classes and self.pages is None:
+                self._in_pagination = True
+            elif self._title_parts is not None:
+                self._title_depth += 1
+            elif self._in_row and self._lang is not None and self._title is None and 'magyar' in classes:
+                self._title_parts = list()
+                self._title_depth = 1
+            return
+
+        if tag == 'a':
+            href = dict(attrs).get('href') or ''
+            if self._in_pagination and href:
+                self._pagination_links += 1
+            elif self._in_row and self._title is not None and 'action=letolt' in href:
+                self.rows.append((self._lang, self._title, href))
+                self._reset_row()
+            return
+
+        if tag == 'small' and self._in_row and self._lang is None and self._lang_parts is None:
+            self._lang_parts = list()
+
+    def handle_endtag(self, tag):
+        if tag == 'small' and self._lang_parts is not None:
+            self._lang = ''.join(self._lang_parts).strip()
+            self._lang_parts = None
+        elif tag == 'div' and self._in_pagination:
+            self._in_pagination = False
+            self.pages = self._pagination_links
+        elif tag == 'div' and self._title_parts is not None:
+            self._title_depth -= 1
+            if self._title_depth == 0:
+                self._title = ''.join(self._title_parts).strip()
+                self._title_parts = None
+
+    def handle_data(self, data):
+        if self._lang_parts is not None:
+            self._lang_parts.append(data)
+        elif self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def pop_rows(self):
+        """
+        Returns the rows parsed since the last call and releases them
+
+        Returns:
+            list: List of the (lang, title, download_link) tuples
+
+        Raises:
+            None
+        """
+        rows = self.rows
+        self.rows = list()
+        return rows
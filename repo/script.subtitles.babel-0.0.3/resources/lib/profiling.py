@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Opt-in timing spans of the hot path of the addon
+
+A Profiler collects the duration of named spans (e.g. DNS lookup, connection,
+time to first byte, body read, parsing, listing) of one plugin invocation and
+summarizes them in one structured (JSON) line. A disabled profiler costs
+almost nothing, thus the spans can stay in the code permanently.
+"""
+
+import json
+import threading
+import time
+
+
+class _Span:
+    """
+    Context manager that adds its duration to the given span of the profiler
+    """
+
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.add(self._name, time.perf_counter() - self._start)
+
+
+class _NullSpan:
+    """
+    Context manager of a disabled profiler that doesn't measure anything
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Thread safe collector of timing spans
+
+    Args:
+        enabled: The spans are recorded only if it's True
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._start = time.perf_counter()
+        self._spans = dict()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        """
+        Records a measured duration of the given span
+
+        Args:
+            name: Name of the span (e.g. 'ttfb')
+
+            seconds: The measured duration
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            span = self._spans.get(name)
+            if span is None:
+                self._spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    def span(self, name):
+        """
+        Returns a context manager that measures the duration of its block as the given span
+
+        Args:
+            name: Name of the span (e.g. 'parse')
+
+        Returns:
+            Context manager
+
+        Raises:
+            None
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def summary(self, **fields):
+        """
+        Summarizes the recorded spans in one JSON line. Every span has its count, total and maximum duration in milliseconds
+
+        Args:
+            fields: Extra fields of the summary (e.g. action='search')
+
+        Returns:
+            string: The summary line
+
+        Raises:
+            None
+        """
+        with self._lock:
+            spans = {
+                name: {
+                    'count': count,
+                    'total_ms': round(total * 1000, 1),
+                    'max_ms': round(longest * 1000, 1),
+                }
+                for name, (count, total, longest) in self._spans.items()
+            }
+
+        summary = dict(fields)
+        summary['wall_ms'] = round((time.perf_counter() - self._start) * 1000, 1)
+        summary['spans'] = spans
+        return json.dumps(summary, ensure_ascii=False, sort_keys=True)
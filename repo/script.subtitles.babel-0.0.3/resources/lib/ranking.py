@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ranking of the found subtitles
+
+Every parsed row gets a score between 0 and 1 based on how well it fits the
+played media: the language of the subtitle against the preferred languages,
+the season and episode number in its title against the played episode, and
+the release group and the other tokens of the played file name against the
+tokens of the title. The score is used to order the listing and to recognize
+the high-confidence matches that make fetching further result pages
+unnecessary.
+"""
+
+import os
+import re
+
+# Weights of the components of the score, their sum is 1
+LANGUAGE_WEIGHT = 0.3
+EPISODE_WEIGHT = 0.3
+GROUP_WEIGHT = 0.2
+TOKEN_WEIGHT = 0.2
+
+# Rows scoring at least this much are high-confidence matches, e.g. a subtitle
+# of the played episode in the first preferred language
+CONFIDENT_SCORE = 0.6
+
+# Season and episode markers of the titles and file names (S01E02 or 1x02)
+EPISODE_PATTERN = re.compile(r'(?:s(\d{1,2})\s*e(\d{1,3})|\b(\d{1,2})x(\d{1,3})\b)', re.IGNORECASE)
+
+# Separators of the tokens of a release name
+TOKEN_PATTERN = re.compile(r'[^\w]+|_')
+
+# The first token of a release name after its title: the episode marker, the
+# year, the resolution or the source
+RELEASE_TAIL_PATTERN = re.compile(
+    r'\b(?:s\d{1,2}\s*e\d{1,3}|\d{1,2}x\d{1,3}|(?:19|20)\d{2}|\d{3,4}p|web|webrip|hdtv|bluray|bdrip|dvdrip|x26[45]|h26[45])\b',
+    re.IGNORECASE
+)
+
+
+def tokenize(text):
+    """
+    Splits a title or a release name into lowercase tokens
+
+    Args:
+        text: The title or the release name
+
+    Returns:
+        set: The tokens
+
+    Raises:
+        None
+    """
+    return {token for token in TOKEN_PATTERN.split(text.lower()) if token}
+
+
+def release_title(file_name):
+    """
+    Derives the title of the media from the name of a scene release, e.g. 'The.Office.US.S01E02.720p.WEB.H264-GRP.mkv' is 'The Office US'
+
+    Args:
+        file_name: Path or name of the played file
+
+    Returns:
+        string: The title or an empty string if the name has no title part
+
+    Raises:
+        None
+    """
+    release = os.path.splitext(os.path.basename(file_name or ''))[0]
+    words = ' '.join(token for token in TOKEN_PATTERN.split(release) if token)
+
+    match = RELEASE_TAIL_PATTERN.search(words)
+    return words[:match.start()].strip() if match else words
+
+
+def find_episode(text):
+    """
+    Finds the season and episode marker in a title or a release name
+
+    Args:
+        text: The title or the release name
+
+    Returns:
+        tuple: (season, episode) pair of integers or None if there's no marker
+
+    Raises:
+        None
+    """
+    match = EPISODE_PATTERN.search(text)
+    if not match:
+        return None
+
+    season, episode = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+    return int(season), int(episode)
+
+
+class Ranker:
+    """
+    Scores the (lang, title, download_link) rows against the played media
+
+    Args:
+        language_codes: Dict that translates the languages of the website to ISO 639-1 codes
+
+        preferred_languages: ISO 639-1 codes of the preferred subtitle languages in order of preference
+
+        file_name: Path or name of the played file. Optional
+
+        season: Season number of the played episode, 0 if unknown
+
+        episode: Episode number of the played episode, 0 if unknown
+    """
+
+    def __init__(self, language_codes, preferred_languages=(), file_name='', season=0, episode=0):
+        self.language_codes = language_codes
+        self.preferred_languages = [code for code in preferred_languages if code]
+
+        release = os.path.splitext(os.path.basename(file_name or ''))[0]
+        self.file_tokens = tokenize(release)
+
+        # The release group is the part after the last hyphen of a scene
+        # release name (e.g. 'Show.S01E02.1080p.WEB.H264-GROUP')
+        self.release_group = release.rsplit('-', 1)[1].lower() if '-' in release else ''
+
+        # The episode marker of the file name is used if Kodi doesn't know
+        # the episode
+        if not (season and episode):
+            season, episode = find_episode(release) or (0, 0)
+        self.season = season
+        self.episode = episode
+
+    def score(self, row):
+        """
+        Scores a row
+
+        Args:
+            row: (lang, title, download_link) tuple
+
+        Returns:
+            float: The score between 0 and 1
+
+        Raises:
+            None
+        """
+        lang, title, _ = row
+        score = 0.0
+
+        code = self.language_codes.get(lang)
+        if code in self.preferred_languages:
+            # The first preferred language gets the full weight
+            score += LANGUAGE_WEIGHT if code == self.preferred_languages[0] else LANGUAGE_WEIGHT * 2 / 3
+
+        if self.season and self.episode:
+            found = find_episode(title)
+            if found == (self.season, self.episode):
+                score += EPISODE_WEIGHT
+            elif found is not None:
+                # A subtitle of an other episode is never a good match
+                return score / 2
+
+        if self.file_tokens:
+            title_tokens = tokenize(title)
+            if self.release_group and self.release_group in title_tokens:
+                score += GROUP_WEIGHT
+            score += TOKEN_WEIGHT * len(self.file_tokens & title_tokens) / len(self.file_tokens)
+
+        return score
+
+    def is_confident(self, row):
+        """
+        Decides whether the row is a high-confidence match
+
+        Args:
+            row: (lang, title, download_link) tuple
+
+        Returns:
+            bool: True if the score of the row reaches CONFIDENT_SCORE
+
+        Raises:
+            None
+        """
+        return self.score(row) >= CONFIDENT_SCORE
+
+    def rank(self, rows, top_k=0):
+        """
+        Orders the rows by their score. Rows with the same score keep the order of the website
+
+        Args:
+            rows: List of (lang, title, download_link) tuples
+
+            top_k: Maximum number of returned rows, 0 means no limit
+
+        Returns:
+            list: The best rows in descending order of their score
+
+        Raises:
+            None
+        """
+        ranked = sorted(rows, key=self.score, reverse=True)
+        return ranked[:top_k] if top_k > 0 else ranked
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact records of the listed subtitles
+
+A search may list hundreds of subtitles. Every listed subtitle is held in a
+SubtitleResult whose attributes are stored in slots, thus no dict is
+allocated per subtitle. The same subtitle may be found more than once (e.g.
+the result pages shift while a search pages through them), the repetitions
+are dropped by unique_rows() before the ranking, thus they don't take the
+places of the listing either.
+"""
+
+from urllib.parse import parse_qsl, urlsplit
+
+
+class SubtitleResult:
+    """
+    A found subtitle as it's listed in Kodi
+
+    Args:
+        lang: Language of the subtitle as it's written on https://feliratok.eu
+
+        code: ISO code of the language, it's the name of the flag icon also
+
+        title: Title of the subtitle
+
+        url: Full download URL of the subtitle
+    """
+
+    __slots__ = ('lang', 'code', 'title', 'url')
+
+    def __init__(self, lang, code, title, url):
+        self.lang = lang
+        self.code = code
+        self.title = title
+        self.url = url
+
+    def __repr__(self):
+        return f'SubtitleResult({self.lang!r}, {self.title!r}, {self.url!r})'
+
+
+def release_key(download_link):
+    """
+    Returns the key of the subtitle behind a download link. The website identifies every uploaded subtitle by the 'felirat' parameter of its download link, the other parameters (e.g. 'fnev') and the form of the link may differ
+
+    Args:
+        download_link: Download link of the subtitle, relative or full
+
+    Returns:
+        string: The ID of the subtitle or the link itself if it has no ID
+
+    Raises:
+        None
+    """
+    for name, value in parse_qsl(urlsplit(download_link).query):
+        if name == 'felirat' and value:
+            return value
+
+    return download_link
+
+
+def unique_rows(rows):
+    """
+    Drops the rows without a title and the repetitions of a subtitle, e.g. the rows repeated by overlapping result pages. The first row of every subtitle is kept, thus the order of the website doesn't change
+
+    Args:
+        rows: List of the (lang, title, download_link) tuples
+
+    Returns:
+        list: The unique (lang, title, download_link) tuples
+
+    Raises:
+        None
+    """
+    seen = set()
+    unique = list()
+
+    for row in rows:
+        if not row[1]:
+            continue
+
+        key = release_key(row[2])
+        if key in seen:
+            continue
+
+        seen.add(key)
+        unique.append(row)
+
+    return unique
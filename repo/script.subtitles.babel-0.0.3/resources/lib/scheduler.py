@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scheduler of the requests sent to https://feliratok.eu
+
+Every request of the HTTP clients goes through a RequestScheduler that
+- limits the request rate with a token bucket, thus the parallel page
+  downloads and the background prefetch can't flood the website and get the
+  shared IP address banned,
+- repeats the requests failed by a timeout, a dropped connection or a 5xx
+  (or 429) response after a jittered exponential backoff,
+- gives up once the deadline of the request is over,
+- refuses every request for a while after the maintenance page was seen. The
+  state of this circuit breaker is stored in the addon data folder, thus it's
+  shared by the plugin invocations and the background service.
+"""
+
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+from resources.lib.cache import write_json_atomic
+from resources.lib.http_client import HttpError
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker is open
+    """
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised if a request can't be completed before its deadline
+    """
+
+
+def is_retryable(error):
+    """
+    Decides whether a failed request is worth repeating
+
+    Args:
+        error: The exception raised by the request
+
+    Returns:
+        bool: True for timeouts, dropped connections and 5xx or 429 responses
+
+    Raises:
+        None
+    """
+    if isinstance(error, HttpError):
+        return error.status >= 500 or error.status == 429
+    if isinstance(error, DeadlineExceeded):
+        return False
+
+    # asyncio is loaded by the asyncio engine only, its own TimeoutError (a
+    # separate class before Python 3.11) can't be raised without it
+    asyncio = sys.modules.get('asyncio')
+    timeouts = (socket.timeout, TimeoutError) + ((asyncio.TimeoutError,) if asyncio else ())
+
+    return isinstance(error, timeouts + (ConnectionError,))
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket. Every request takes a token, the tokens are refilled at a constant rate up to the capacity of the bucket
+
+    Args:
+        rate: Number of tokens refilled per second. 0 disables the limit
+
+        capacity: Maximum number of tokens, i.e. the size of a burst of requests
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token. If the bucket is empty the token is reserved ahead of time
+
+        Returns:
+            float: Number of seconds the caller has to wait before sending its request
+
+        Raises:
+            None
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+
+            # A negative balance is the queue of the waiting requests
+            return max(0.0, -self._tokens / self.rate)
+
+
+class PageBudget:
+    """
+    Thread safe budget of the result pages downloaded by the queries of one search
+
+    Args:
+        pages: Number of result pages the queries may download together. 0 disables the limit
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Takes a page from the budget
+
+        Returns:
+            bool: True if the page can be downloaded, False if the budget is spent
+
+        Raises:
+            None
+        """
+        if self.pages <= 0:
+            return True
+
+        with self._lock:
+            if self._used >= self.pages:
+                return False
+            self._used += 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of the maintenance of https://feliratok.eu stored in a JSON file
+
+    Args:
+        path: Path of the JSON file of the state
+
+        cooldown: Number of seconds the breaker stays open after the maintenance page was seen. 0 disables the breaker
+    """
+
+    def __init__(self, path, cooldown):
+        self.path = path
+        self.cooldown = cooldown
+
+    def _open_until(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return float(json.load(f).get('open_until', 0))
+        except (OSError, ValueError, AttributeError):
+            return 0.0
+
+    def is_open(self):
+        """
+        Returns True if the maintenance page was seen within the cooldown
+        """
+        return self.cooldown > 0 and self._open_until() > time.time()
+
+    def trip(self):
+        """
+        Opens the breaker for the cooldown. A failing write only means that the next invocation checks the website again
+        """
+        if self.cooldown <= 0:
+            return
+
+        try:
+            write_json_atomic(self.path, {'open_until': time.time() + self.cooldown})
+        except OSError:
+            pass
+
+
+class RequestScheduler:
+    """
+    Rate limiter, retry and deadline layer of the requests
+
+    Args:
+        bucket: TokenBucket of the requests
+
+        breaker: CircuitBreaker of the maintenance. Optional
+
+        retries: Maximum number of repetitions of a failed request
+
+        deadline: Number of seconds a request (with its repetitions and waits) may take
+
+        base_delay: Upper bound of the first backoff in seconds, it's doubled for every repetition
+
+        max_delay: Upper bound of every backoff in seconds
+    """
+
+    def __init__(self, bucket, breaker=None, retries=3, deadline=20.0, base_delay=0.5, max_delay=8.0):
+        self.bucket = bucket
+        self.breaker = breaker
+        self.retries = retries
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """
+        Returns the wait before the repetition of a failed request. The wait is chosen randomly below an exponentially growing bound (full jitter), thus the repetitions of the parallel requests don't arrive at the same time
+
+        Args:
+            attempt: Number of the failed attempts so far minus one
+
+        Returns:
+            float: The wait in seconds
+
+        Raises:
+            None
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _before_attempt(self, deadline):
+        """
+        Checks the circuit breaker and reserves a token. Returns the wait before the attempt.
+        """
+        if self.breaker is not None and self.breaker.is_open():
+            raise CircuitOpenError('https://feliratok.eu is under maintenance')
+
+        wait = self.bucket.reserve()
+        if time.monotonic() + wait >= deadline:
+            raise DeadlineExceeded('Request rate limit exceeded the deadline')
+        return wait
+
+    def _after_failure(self, error, attempt, deadline):
+        """
+        Returns the backoff before the next attempt or raises the error if the request is not repeated.
+        """
+        if attempt >= self.retries or not is_retryable(error):
+            raise error
+
+        delay = self.backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            raise error
+        return delay
+
+    def run(self, request):
+        """
+        Executes a request with rate limiting, repetitions and deadline
+
+        Args:
+            request: Function called with the remaining time of the deadline in seconds, it sends the request and returns its response
+
+        Returns:
+            The return value of the request
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+
+            DeadlineExceeded: If the rate limit doesn't allow the request before its deadline
+
+            Exception: The error of the last attempt
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+
+        while True:
+            time.sleep(self._before_attempt(deadline))
+            try:
+                return request(deadline - time.monotonic())
+            except Exception as error:
+                delay = self._after_failure(error, attempt, deadline)
+            attempt += 1
+            time.sleep(delay)
+
+    async def run_async(self, request):
+        """
+        Asyncio counterpart of run(). The request is a coroutine function called with the remaining time of the deadline
+        """
+        import asyncio
+
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+
+        while True:
+            await asyncio.sleep(self._before_attempt(deadline))
+            try:
+                return await request(deadline - time.monotonic())
+            except Exception as error:
+                delay = self._after_failure(error, attempt, deadline)
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent index of the series IDs of https://feliratok.eu
+
+The website identifies every series by an internal ID (the 'sid' parameter
+of the search). A search filtered by the ID returns the subtitles of the
+series only, thus it fits on far fewer pages than the full-text search of
+the title. The index maps the normalized titles and the IMDb numbers of the
+series to their IDs in an SQLite file of the addon data folder, thus the IDs
+found by one plugin invocation are known by the later ones also. A title
+the website doesn't know is stored as a miss (an empty ID), thus it's not
+looked up again until the miss expires.
+"""
+
+import os
+import re
+import sqlite3
+import time
+
+# Version of the schema of the index. An index of an other version is
+# recreated
+SCHEMA_VERSION = 1
+
+# Seconds after which a title that the website didn't know is looked up
+# again, thus a series added to the website later is found
+MISS_TTL = 24 * 60 * 60
+
+# The year or the country in parentheses after a title, e.g. 'Shameless (US)'
+QUALIFIER_PATTERN = re.compile(r'\s*\([^)]*\)\s*$')
+
+# Characters that are not part of the words of a title
+PUNCTUATION_PATTERN = re.compile(r'[^\w]+')
+
+
+def normalize_title(title):
+    """
+    Normalizes a series title, thus the title of Kodi and the one of the website match. The year or country in parentheses is dropped, an article moved to the end ('Office, The') is moved back, and the title is lowercased without punctuation
+
+    Args:
+        title: Title of the series
+
+    Returns:
+        string: The normalized title, empty if there's no title
+
+    Raises:
+        None
+    """
+    title = QUALIFIER_PATTERN.sub('', title or '').strip()
+
+    match = re.match(r'^(.*),\s*(the|a|an)$', title, re.IGNORECASE)
+    if match:
+        title = f'{match.group(2)} {match.group(1)}'
+
+    return ' '.join(PUNCTUATION_PATTERN.sub(' ', title.lower()).split())
+
+
+def title_matches(site_name, title):
+    """
+    Decides whether a series name of the website (e.g. 'Office, The (2005)') is the given title
+
+    Args:
+        site_name: Name of the series on the website
+
+        title: Title of the series in Kodi
+
+    Returns:
+        bool: True if the normalized names are equal
+
+    Raises:
+        None
+    """
+    return bool(title) and normalize_title(site_name) == normalize_title(title)
+
+
+class SeriesIndex:
+    """
+    SQLite index of the series IDs keyed by normalized titles and IMDb numbers. Every failing database operation results a miss, thus a locked or corrupted database never breaks the search
+
+    Args:
+        path: Path of the SQLite file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+
+    def _connect(self):
+        """
+        Opens the database and creates its table on the first use.
+        """
+        if self._connection is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+            connection = sqlite3.connect(self.path, timeout=5)
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                with connection:
+                    connection.execute('DROP TABLE IF EXISTS series')
+                    connection.execute(
+                        'CREATE TABLE series (key TEXT PRIMARY KEY, sid TEXT NOT NULL, updated REAL NOT NULL)'
+                    )
+                    connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self._connection = connection
+
+        return self._connection
+
+    @staticmethod
+    def _keys(title, imdb):
+        keys = list()
+        if imdb:
+            keys.append(f'imdb:{imdb.strip().lower()}')
+        normalized = normalize_title(title)
+        if normalized:
+            keys.append(f'title:{normalized}')
+        return keys
+
+    def lookup(self, title='', imdb=''):
+        """
+        Finds the ID of a series by its IMDb number or its title. The IMDb number is checked first
+
+        Args:
+            title: Title of the series
+
+            imdb: IMDb number of the series (e.g. 'tt0386676')
+
+        Returns:
+            string: The ID of the series, '' if the website didn't know the series recently (see remember_miss()) or None if it's not in the index
+
+        Raises:
+            None
+        """
+        keys = self._keys(title, imdb)
+        if not keys:
+            return None
+
+        missed = False
+        try:
+            connection = self._connect()
+            for key in keys:
+                row = connection.execute('SELECT sid, updated FROM series WHERE key = ?', (key,)).fetchone()
+                if row and row[0]:
+                    return row[0]
+                if row and time.time() - row[1] < MISS_TTL:
+                    missed = True
+        except (sqlite3.Error, OSError):
+            pass
+
+        return '' if missed else None
+
+    def remember(self, sid, title='', imdb=''):
+        """
+        Stores the ID of a series under its IMDb number and its title
+
+        Args:
+            sid: The ID of the series on the website
+
+            title: Title of the series
+
+            imdb: IMDb number of the series
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        now = time.time()
+        try:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO series (key, sid, updated) VALUES (?, ?, ?)',
+                    [(key, str(sid), now) for key in self._keys(title, imdb)]
+                )
+        except (sqlite3.Error, OSError):
+            pass
+
+    def remember_miss(self, title='', imdb=''):
+        """
+        Stores that the website doesn't know a series, thus it's not looked up again for MISS_TTL seconds. An ID stored before is kept
+
+        Args:
+            title: Title of the series
+
+            imdb: IMDb number of the series
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        now = time.time()
+        keys = self._keys(title, imdb)
+        try:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO series (key, sid, updated) VALUES (?, '', ?)",
+                    [(key, now) for key in keys]
+                )
+                connection.executemany(
+                    "UPDATE series SET updated = ? WHERE key = ? AND sid = ''",
+                    [(now, key) for key in keys]
+                )
+        except (sqlite3.Error, OSError):
+            pass
+
+    def close(self):
+        """
+        Closes the database
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -17,22 +17,34 @@ __status__ = "Beta"
 
 # Importing required Python modules
 
+import json
 import os
 import sys
+import xbmcaddon
 import xbmcgui
 import xbmcplugin
 import xbmc
 import xbmcvfs
+from collections import deque
 from urllib.parse import parse_qsl
+from urllib.parse import quote
+from urllib.parse import quote_plus
 from urllib.parse import urlencode
-import urllib.request
 
-# Using the 're' module to collect data from HTML pages because it's part of
-# the basic Python package, thus no dependecy installation is required and
-# provides compatibility with older Kodi versions also
+import codecs
+import threading
+import time
 
-import re
-import io
+from resources.lib.cache import DownloadCache, PageCache, SearchCache, conditional_headers, normalize_query
+from resources.lib.profiling import Profiler
+from resources.lib.ranking import Ranker, find_episode
+from resources.lib.results import SubtitleResult, release_key, unique_rows
+
+# Kodi starts a new Python interpreter for every plugin invocation, thus
+# every module imported here is paid for by each search and download. The
+# modules needed by some of the actions only (the HTTP client and TLS, the
+# HTML parser, the thread pool, asyncio, zipfile, sqlite3) are imported by
+# the functions that use them, see benchmarks/bench_startup.py
 
 # Creating dict with ISO language equivalents
 
@@ -68,6 +80,30 @@ languages = {
     "Török": "tr"
 }
 
+def build_language_index():
+    """
+    Creates the reverse index of the 'languages' dict
+
+    Args:
+        None
+
+    Returns:
+        dict: Lists of the language names of https://feliratok.eu by their ISO code
+
+    Raises:
+        None
+    """
+    index = dict()
+    for name, code in languages.items():
+        index.setdefault(code, list()).append(name)
+
+    return index
+
+# The website names some languages more than one way (e.g. Dutch is
+# 'Flamand' and 'Holland'), thus an ISO code may have more names
+
+language_names = build_language_index()
+
 # Storing the main URL in a variable for easier use..
 main_link = "https://feliratok.eu"
 
@@ -75,6 +111,133 @@ main_link = "https://feliratok.eu"
 
 headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
 
+# Handle of the addon, used to read the user settings
+
+addon = xbmcaddon.Addon()
+
+def get_setting_int(setting_id, default):
+    """
+    Reads an integer setting of the addon. Kodi returns every setting as a string, hence the conversion
+
+    Args:
+        setting_id: ID of the setting defined in the resources/settings.xml file
+
+        default: Value returned if the setting is missing or it's not a number
+
+    Returns:
+        int: Value of the setting
+
+    Raises:
+        None
+    """
+    try:
+        return int(addon.getSetting(setting_id))
+    except (TypeError, ValueError):
+        return default
+
+def get_setting_bool(setting_id):
+    """
+    Reads a boolean setting of the addon
+
+    Args:
+        setting_id: ID of the setting defined in the resources/settings.xml file
+
+    Returns:
+        bool: Value of the setting, False if the setting is missing
+
+    Raises:
+        None
+    """
+    return addon.getSetting(setting_id) == 'true'
+
+# Timing spans of the hot path of the invocation. Enabled by the 'profiling'
+# setting, the summary is written to the kodi.log at the end of the invocation
+
+profiler = Profiler(enabled=get_setting_bool('profiling'))
+
+def build_scheduler():
+    """
+    Creates the scheduler of the requests sent to https://feliratok.eu based on the 'Network' settings: the request rate and burst of the token bucket, the number of repetitions and the deadline of a request, and the cooldown of the maintenance circuit breaker (minutes)
+
+    Args:
+        None
+
+    Returns:
+        RequestScheduler: The scheduler of the requests
+
+    Raises:
+        None
+    """
+    from resources.lib.scheduler import CircuitBreaker, RequestScheduler, TokenBucket
+
+    profile_dir = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
+    return RequestScheduler(
+        TokenBucket(rate=get_setting_int('request_rate', 5), capacity=get_setting_int('request_burst', 10)),
+        CircuitBreaker(os.path.join(profile_dir, 'maintenance.json'), cooldown=get_setting_int('maintenance_cooldown', 5) * 60),
+        retries=get_setting_int('request_retries', 3),
+        deadline=get_setting_int('request_deadline', 20)
+    )
+
+# Every request to https://feliratok.eu goes through the scheduler, thus the
+# parallel page downloads and the prefetch can't flood the website. Created
+# by get_scheduler() on the first use
+
+scheduler = None
+
+# The parallel queries of a search call the getters of the shared objects at
+# the same time, thus the objects are created under a lock. Reentrant, because
+# get_client() calls get_scheduler()
+shared_lock = threading.RLock()
+
+def get_scheduler():
+    """
+    Returns the scheduler of the requests, it's created on the first call
+
+    Args:
+        None
+
+    Returns:
+        RequestScheduler: The scheduler of the requests
+
+    Raises:
+        None
+    """
+    global scheduler
+    if scheduler is None:
+        with shared_lock:
+            if scheduler is None:
+                scheduler = build_scheduler()
+    return scheduler
+
+# Shared HTTP client of the plugin invocation. It keeps the connections to
+# https://feliratok.eu alive, thus the result pages and the subtitle download
+# don't pay for a new TCP and TLS handshake every time. Created by
+# get_client() on the first request, thus an invocation served from the
+# caches doesn't load the HTTP and TLS modules at all
+
+client = None
+
+def get_client():
+    """
+    Returns the shared HTTP client of the plugin invocation, it's created on the first call
+
+    Args:
+        None
+
+    Returns:
+        HttpClient: The HTTP client of the invocation
+
+    Raises:
+        None
+    """
+    global client
+    if client is None:
+        with shared_lock:
+            if client is None:
+                from resources.lib.http_client import HttpClient
+                client = HttpClient(headers=headers, profiler=profiler, scheduler=get_scheduler())
+    return client
+
 def log_netmozi_metadata():
     """
     Examines the metadata of the media currently played by Kodi. If those are available (such as the series and episode number) the subtitle can be searched on a more precise way. This function is not in use yet but required for upcoming release
@@ -115,295 +278,1677 @@ def log_netmozi_metadata():
     else:
         xbmc.log("### DEBUG ###: No media is played.", level=xbmc.LOGINFO)
 
-def get_html_content(url):
+def iter_html_content(url, response=None):
     """
-    Retrieves the HTML content of the given URL as a plain text
+    Retrieves the HTML content of the given URL as plain text chunks while the bytes arrive from the socket, thus the whole page is never held in memory
 
     Args:
         url: URL of the webpage for whose content is required
 
+        response: The already opened response of the URL (e.g. of a conditional request). Optional
+
+    Returns:
+        Generator of strings: Plain text chunks of the webpage decoded in utf-8
+
+    Raises:
+        HttpError: If the website responds with an error status code
+
+        OSError: If the website is not responding
+    """
+    # The incremental decoder keeps the bytes of a multi-byte character that
+    # is split between two chunks
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+
+    with response or get_client().open(url) as response:
+        for chunk in response.iter_chunks():
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+def build_search_url(http_query_params):
+    """
+    Compiles the search URL of https://feliratok.eu from the given query parameters
+
+    Args:
+        http_query_params: Dict of the query string parameters of the search
+
+    Returns:
+        string: The final URL that is called for the web search
+
+    Raises:
+        None
+    """
+    # If the media title contains special characters percent coding is
+    # required to make the final query URL interpretable for
+    # https://feliratok.eu website
+    query_string = urlencode(http_query_params)
+    return main_link + f'/index.php?{query_string}'
+
+def is_not_modified(url, response, entry):
+    """
+    Decides whether a result page was not modified since its rows were stored in the page cache, i.e. the conditional request of the page was answered by '304 Not Modified'
+
+    Args:
+        url: URL of the result page
+
+        response: Response of the conditional request of the page
+
+        entry: Entry of the page returned by PageCache.get() or None
+
+    Returns:
+        bool: True if the cached rows of the page can be reused
+
+    Raises:
+        None
+    """
+    if response.status != 304 or entry is None:
+        return False
+
+    xbmc.log(f"Babel: Result page not modified, {len(entry['rows'])} rows reused: {url}", xbmc.LOGDEBUG)
+    return True
+
+def reuse_page(entry, on_row, on_pagination=None):
+    """
+    Hands over the rows of a result page stored in the page cache, used if the page was not modified since it was parsed
+
+    Args:
+        entry: Entry of the page returned by PageCache.get()
+
+        on_row: Function called with every cached (lang, title, download_link) tuple
+
+        on_pagination: Function called with the cached number of result pages. Optional
+
+    Returns:
+        ResultPageParser: A parser that holds the cached number of result pages, thus it can stand in for the parser of the page
+
+    Raises:
+        None
+    """
+    from resources.lib.parser import ResultPageParser
+
+    parser = ResultPageParser()
+    parser.pages = entry['pages']
+
+    # The rest of the result pages can be requested at once
+    if on_pagination is not None and parser.pages is not None:
+        on_pagination(parser.pages)
+
+    for row in entry['rows']:
+        on_row(row)
+
+    return parser
+
+def parse_result_page(url, on_row, on_pagination=None, page_cache=None):
+    """
+    Downloads and parses a result page of https://feliratok.eu. The page is parsed while its bytes arrive from the socket and every subtitle row is handed over to the 'on_row' function as soon as it's parsed. If the page is in the page cache it's revalidated by a conditional request, and its cached rows are reused if it was not modified
+
+    Args:
+        url: URL of the result page
+
+        on_row: Function called with every parsed (lang, title, download_link) tuple
+
+        on_pagination: Function called with the number of result pages as soon as the pagination block is parsed. Optional
+
+        page_cache: PageCache of the validators and the rows of the result pages. Optional
+
     Returns:
-        string: Plain text content of the webpage decoded in utf-8
+        ResultPageParser: The parser of the page (see its 'pages' and 'maintenance' attributes) or None if the page couldn't be downloaded
 
     Raises:
-        ConnectionError: If the website is not responding.
+        None
     """
+    from resources.lib.parser import ResultPageParser
+
+    parser = ResultPageParser()
+    parse_seconds = 0.0
+    entry = page_cache.get(url) if page_cache else None
+    rows = list()
+
     try:
-        req = urllib.request.Request(url, headers=headers)
-        response = urllib.request.urlopen(req)
-        content = response.read().decode('utf-8', errors='ignore')
-        return content
+        response = get_client().open(url, conditional_headers(entry))
+
+        # Neither the body is downloaded nor the page is parsed again if it
+        # was not modified
+        if is_not_modified(url, response, entry):
+            response.read()
+            return reuse_page(entry, on_row, on_pagination)
+
+        for text in iter_html_content(url, response):
+            start = time.perf_counter()
+            parser.feed(text)
+            parse_seconds += time.perf_counter() - start
+
+            for row in parser.pop_rows():
+                rows.append(row)
+                on_row(row)
+
+            # The rest of the result pages can be requested while this page
+            # is still downloading
+            if on_pagination is not None and parser.pages is not None:
+                on_pagination(parser.pages)
+                on_pagination = None
+
+        parser.close()
     except Exception as error:
         xbmc.log(f"Babel: Connection error: {error}", xbmc.LOGERROR)
+        return None
+
+    # One 'parse' span is recorded per page
+    profiler.add('parse', parse_seconds)
 
-def get_content_by_regex(html, regex, search_type):
+    for row in parser.pop_rows():
+        rows.append(row)
+        on_row(row)
+
+    if page_cache and not parser.maintenance:
+        page_cache.put(url, response.headers, rows, parser.pages)
+
+    return parser
+
+def fetch_page_rows(url, page_cache=None):
     """
-    Retrieves data from the given HTML page defined by the regular expression. It uses two search types: search - retrieves the first instance found by the RegEx; findall - retrieves all instances found by the RegEx
+    Downloads and parses a result page of https://feliratok.eu. Used by the worker threads that download the pages 2..N. Only the first page is parsed while it arrives (its pagination block starts the download of the other pages), the others are parsed at once by the regular expressions of extract_rows(), as it's much faster than the streaming parser
+
     Args:
-        html: The HTML content on which the RegEx should be applied
+        url: URL of the result page
+
+        page_cache: PageCache of the validators and the rows of the result pages. Optional
+
+    Returns:
+        list: List of the (lang, title, download_link) tuples of the page or None if the page couldn't be downloaded
+
+    Raises:
+        None
+    """
+    entry = page_cache.get(url) if page_cache else None
+
+    try:
+        response = get_client().open(url, conditional_headers(entry))
+
+        # The page is not parsed again if it was not modified
+        if is_not_modified(url, response, entry):
+            response.read()
+            return entry['rows']
+
+        with response:
+            body = response.read()
+    except Exception as error:
+        xbmc.log(f"Babel: Connection error: {error}", xbmc.LOGERROR)
+        return None
+
+    from resources.lib.parser import extract_rows
+
+    with profiler.span('parse'):
+        rows = extract_rows(body.decode('utf-8', errors='ignore'))
+
+    if page_cache:
+        page_cache.put(url, response.headers, rows, None)
 
-        regex: The regular expression based on the serch should be executed on the HTML content
+    return rows
 
-        search_type : Type of the search. It accepts two values:
+# True once the maintenance of the website is reported by the current search
+# or prefetch. Reset by reset_maintenance_report(), because the service keeps
+# the module imported
+maintenance_reported = False
 
-            search - retrieves the first instance found by the RegEx
+def reset_maintenance_report():
+    """
+    Lets the next maintenance page be reported again, called at the start of every search and prefetch
 
-            findall - retrieves all instances found by the RegEx
+    Args:
+        None
 
     Returns:
-        in case of search: match object
-        
-        in case of findall: list()
+        None
 
     Raises:
         None
     """
-    if search_type == 'search':
-        return re.search(regex, html, re.DOTALL)
-    if search_type == 'findall':
-        return re.findall(regex, html)
+    global maintenance_reported
+    maintenance_reported = False
 
-def search(media_title):
+def report_maintenance(background=False):
     """
-    Actual subtitle serach of the media on the https://feliratok.hu website. Result of this search is handed over to the download() function which executes the actual subtitle download.
+    Reports that https://feliratok.eu is under maintenance
 
     Args:
-        media_title: Title of the media currently played or the search term submitted by the user through the 'Manual search' option from Kodi
+        background: True if the search runs in the background, then nothing is shown on the screen
 
     Returns:
-        None. Prepares a 'params_to_send' variable that contains all neccessary information for the download callback function. If the user clicks on a particular subtitle listed on the Kodi result window this variable is haded over to the download() function
+        None. The maintenance is written in the kodi.log and a short notice is provided in a Kodi pop-up window also. The circuit breaker of the scheduler is opened, thus no request is sent to the website for a while
 
     Raises:
         None
     """
+    global maintenance_reported
+
+    # The breaker is opened every time. The parallel queries of a search may
+    # see the maintenance page at the same time, but it's reported once
+    get_scheduler().breaker.trip()
+    if maintenance_reported:
+        return
+    maintenance_reported = True
+
+    xbmc.log(f"Babel: https://feliratok.eu is under maintenance.", xbmc.LOGINFO)
+    if background:
+        return
+
+    xbmcgui.Dialog().notification(
+        'Babel',                  # Title
+        'https://feliratok.eu is under maintenance.', # Message
+        xbmcgui.NOTIFICATION_WARNING,     # Icon (yellow exclamation mark)
+        5000                              # Message appearance time -> 5 mp
+    )
+
+def fetch_matches(http_query_params, on_row, should_stop=None, background=False, page_cache=None, budget=None):
+    """
+    Downloads and parses all the result pages of the given search from https://feliratok.eu. Pages 2..N are downloaded at the same time by a thread pool as soon as the pagination block of page 1 is parsed. The number of parallel downloads is limited by the 'page_workers' setting not to flood https://feliratok.eu with requests
 
-    # Defining parameters of the query string that is used to complie the final URL that is called for the web search
+    Args:
+        http_query_params: Dict of the query string parameters of the search
 
-    http_query_params = {
-        'search': media_title,
-        'soriSorszam': '',
-        'nyelv': '',
-        'sorozatnev': '',
-        'sid': '',
-        'complexsearch': 'true',
-        'knyelv': 0,
-        'evad': '',
-        'epizod1': '',
-        'elotag': 0,
-        'minoseg': 0,
-        'rlsr': 0,
-        'tab': 'all',
-        'page': 1,
-    }
+        on_row: Function called with every parsed (lang, title, download_link) tuple in page order
+
+        should_stop: Function checked after every page. If it returns True no further page is requested. Optional
+
+        background: True if the search runs in the background (prefetch). Then the pages are downloaded one by one and the maintenance is not notified on the screen
+
+        page_cache: PageCache that revalidates the result pages. Optional
+
+        budget: PageBudget shared by the queries of the search. The pages over the budget are not requested. Optional
+
+    Returns:
+        bool: True if every result page was downloaded, False otherwise. None is returned instead if the website is under maintenance
+
+    Raises:
+        None
+    """
+    # The website is not contacted for a while after the maintenance page
+    # was seen
+    if get_scheduler().breaker.is_open():
+        report_maintenance(background)
+        return None
+
+    http_query_params['page'] = 1
+    url = build_search_url(http_query_params)
 
-    # If the media title contains special characters percent coding is
-    # required to make the final query URL interpretable for
-    # https://feliratok.eu website
-    query_string = urlencode(http_query_params)
-    url = main_link + f'/index.php?{query_string}'
-  
     # Writing the final search URL to log to see what is submitted to the
     # website
     xbmc.log(f"Babel: Search URL called by Kodi: {url}", xbmc.LOGINFO)
-    
-    # Getting the HTML response of the search URL from https//feliratok.eu
-    html_content = get_html_content(url)
-
-    # If the https://feliratok.hu is down becasue of maintenance it's written
-    # in the kodi.log and a short notice is provided in a Kodi pop-up window
-    # also
-    if html_content == "Karbantartas, hamarosan jovunk vissza!":
-        xbmc.log(f"Babel: https://feliratok.eu is under maintenance.", xbmc.LOGINFO)
-        xbmcgui.Dialog().notification(
-            'Babel',                  # Title
-            'https://feliratok.eu is under maintenance.', # Message
-            xbmcgui.NOTIFICATION_WARNING,     # Icon (yellow exclamation mark)
-            5000                              # Message appearance time -> 5 mp
-        )
-    else:
-        # Setting the number of result pages to 1
-        no_of_pages = 1
-
-        # Collecting the links of pagination pages in case of multipage result
-        pagination_pattern=r'<div class="pagination">(.*?)</div>'
-        pagination_snipet = get_content_by_regex(html_content, pagination_pattern, 'search')
-
-        # Search for the pagination HTML snipet. If the serch returns with
-        # multipage results we count how many pagination links can be found in
-        # it as all should be processed by setting the count of the 'page:'
-        # paramtere of the 'http_query_params' string to parse all of the 
-        # result pages. If the pagination snipet doesn't exist the 
-        # 'no_of_pages' variable stays 1
-        if pagination_snipet:
-            # .group(1) returns the content of the first parenthesis pair
-            pagination_content = pagination_snipet.group(1)
-
-            # Getting the links of pagination from the HTML content
-            links = get_content_by_regex(pagination_content, r'<a\s+href=[^>]+>', 'findall')
-
-            # Counting the no. of links. This gives us the number of result
-            # pages
-            no_of_pages = len(links)
-
-        # Writing no. of pages to the log for control check purpose
-        xbmc.log(f"Babel: Felirat oldalak száma: {no_of_pages}", xbmc.LOGINFO)
-
-        # Iterating through all the result pages and collecting the flag,
-        # title and download URL of all subtitles. 'matches' variable should be
-        # created in advance as we are adding additional content to it 
-        # iteration by iteration
-        matches = list()
-
-        for i in range(1, no_of_pages + 1):
-
-            # Provising RegEx pattern to get the flag, title and download URL
-            # of the subtitle
-            pattern = r'<tr id="vilagit".*?<small>(.*?)</small>.*?class="magyar">(.*?)</div>.*?href="([^"]*?action=letolt[^"]*)"'
-
-            # Getting the flag, title and download URL from the response HTML
-            # and adding it to the 'matches' variable
-            matches += re.findall(pattern, html_content, re.DOTALL)
-
-            # Increasing the count of the 'page' parameter in the 
-            #'http_query_params' query string and downloading and parsing the
-            # next result page. After that getting the flag, title and
-            # download URL of all the subtitles on the page in the next
-            # iteration
-            http_query_params['page'] = i + 1
-            query_string = urlencode(http_query_params)
-            url = main_link + f'/index.php?{query_string}'
-            html_content = get_html_content(url)
-
-
-        # Querying the Kodi process ID of the addon
-        handle = int(sys.argv[1])
-        xbmcplugin.setContent(handle, 'subtitles')
-
-        # Setting the flag, title and download URL of all returned subtitles
-        for lang, title_html, download_link in matches:
-            # Setting the proper flag icon based on the 'languages'
-            # translation dict defined at the beginning of this code
-            v_flag = languages[lang]
-
-            # Setting title of subtitle
-            clean_title = re.sub(r'<[^>]*>', '', title_html).strip()
-            
-            # Setting the download link of the subtitle
-            clean_link = download_link.replace('&amp;', '&')
-            full_url = main_link + clean_link if clean_link.startswith('/') else clean_link
-
-            if clean_title:
-                # Handing over the final list of subtiles with all
-                # supplementary information to Kodi. These 'list_items' appear
-                # in the result dropdown list of Kodi
-                list_item = xbmcgui.ListItem(label=clean_title, label2=clean_title)
-                
-                # Setting the flag as icon and thumbnail
-                list_item.setArt({
-                    'icon': v_flag,
-                    'thumb': v_flag
-                }) 
-                
-                # Setting the appropriate subtitle language
-                list_item.setProperty("Language", languages[lang])
-                
-                try:
-                    info_tag = list_item.getVideoInfoTag()
-                    info_tag.setTitle(clean_title)
-                except:
-                    list_item.setInfo('video', {'title': clean_title})
-
-                # Adding title of subtitle to the 'params_to_send' variable to
-                # make it visible for the download() function
-                params_to_send = {
-                    'action': 'download',
-                    'url': full_url,
-                    'title': clean_title
-                }
-                callback_url = f"{sys.argv[0]}?{urlencode(params_to_send)}"
-                
-                xbmcplugin.addDirectoryItem(handle, callback_url, list_item, isFolder=False)
-
-        xbmcplugin.endOfDirectory(handle)
 
-def download(url):
+    # A background search has low priority, thus it doesn't download pages
+    # at the same time
+    max_workers = 1 if background else max(1, get_setting_int('page_workers', 4))
+
+    if budget is not None and not budget.take():
+        xbmc.log("Babel: Page budget of the search is spent, the query is skipped.", xbmc.LOGINFO)
+        return False
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # URLs of the pages waiting for download and the futures of the
+        # pages under download, both in page order
+        page_urls = deque()
+        futures = deque()
+        over_budget = [False]
+
+        def fill_workers():
+            # Only as many pages are requested as many workers are there,
+            # thus the download can be stopped early
+            while page_urls and len(futures) < max_workers:
+                if budget is not None and not budget.take():
+                    xbmc.log(f"Babel: Page budget of the search is spent, {len(page_urls)} pages are not requested.", xbmc.LOGINFO)
+                    over_budget[0] = True
+                    page_urls.clear()
+                    break
+                futures.append(executor.submit(fetch_page_rows, page_urls.popleft(), page_cache))
+
+        def download_remaining_pages(no_of_pages):
+            # Writing no. of pages to the log for control check purpose
+            xbmc.log(f"Babel: Felirat oldalak száma: {no_of_pages}", xbmc.LOGINFO)
+
+            # Compiling the URLs of the remaining result pages. Page 1 is
+            # already downloading, and no request is made past the last page
+            for i in range(2, no_of_pages + 1):
+                page_params = dict(http_query_params, page=i)
+                page_urls.append(build_search_url(page_params))
+
+            fill_workers()
+
+        # Getting the HTML response of the search URL from https//feliratok.eu
+        # and handing over its rows while it's parsed
+        parser = parse_result_page(url, on_row, download_remaining_pages, page_cache)
+
+        if parser is None:
+            return False
+
+        if parser.maintenance:
+            report_maintenance(background)
+            return None
+
+        # If the pagination block doesn't exist the result fits on one page
+        if parser.pages is None:
+            download_remaining_pages(1)
+
+        # Collecting the rows of pages 2..N in page order. A page that
+        # couldn't be downloaded is skipped
+        complete = True
+        while futures:
+            if should_stop is not None and should_stop():
+                xbmc.log(f"Babel: Enough good matches found, {len(page_urls)} pages are not requested.", xbmc.LOGINFO)
+                for future in futures:
+                    future.cancel()
+                return False
+
+            rows = futures.popleft().result()
+            if rows is None:
+                complete = False
+            else:
+                for row in rows:
+                    on_row(row)
+
+            fill_workers()
+
+    return complete and not over_budget[0]
+
+async def parse_result_page_async(async_client, url, on_row, on_pagination=None, page_cache=None):
     """
-    Downloads the subtile selected from the Kodi dorpdown list provided by the search() function
+    Asyncio counterpart of parse_result_page(). The page is parsed while its bytes arrive from the socket, and the event loop runs the downloads of the other pages during the waits for the bytes
 
     Args:
-        url: Download URL of the subtitle provided by the search() function and selected by the end user
+        async_client: AsyncHttpClient of the search
+
+        url: URL of the result page
+
+        on_row: Function called with every parsed (lang, title, download_link) tuple
+
+        on_pagination: Function called with the number of result pages as soon as the pagination block is parsed. Optional
+
+        page_cache: PageCache of the validators and the rows of the result pages. Optional
 
     Returns:
-        None.
+        ResultPageParser: The parser of the page (see its 'pages' and 'maintenance' attributes) or None if the page couldn't be downloaded
 
     Raises:
-        Exception: If nay excpetion occures during the download the function writes it to the kodi.log
+        None
     """
-    # Getting the destination file path provided by Kodi
-    dest_path = params.get('destfile')
-    
-    # If the destiantion file path doesn't exist we create one into the 'temp'
-    # folder
-    if not dest_path:
-        temp_dir = xbmcvfs.translatePath('special://temp')
-        dest_path = os.path.join(temp_dir, 'felirat.srt')
+    from resources.lib.parser import ResultPageParser
 
-    xbmc.log(f"Babel: Direct SRT download: {url} -> {dest_path}", xbmc.LOGINFO)
+    parser = ResultPageParser()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    parse_seconds = 0.0
+    entry = page_cache.get(url) if page_cache else None
+    rows = list()
 
     try:
-        # Defining a User-Agent to avoid banning the script from
-        # https://feliratok.eu
-        req = urllib.request.Request(url, headers=headers)
-        
-        with urllib.request.urlopen(req) as response:
-            data = response.read()
-            
-            # Writing directly to the destiantion file on a binary way or with
-            # xbmcvfs. xbmcvfs.File is the most reliable format on every
-            # platform (Android/Windows/Linux)
-            with xbmcvfs.File(dest_path, 'w') as target:
-                success = target.write(data)
-            
-            if success:
-                xbmc.log("Babel: Subtitle saved successfully.", xbmc.LOGINFO)
-                
-                # Important! We have to notify Kodi that the subtitle file is
-                # ready. For this we have to add the path of the downloaded
-                # subtitle file to the directory
-                list_item = xbmcgui.ListItem(label="Felirat")
-                xbmcplugin.addDirectoryItem(int(sys.argv[1]), dest_path, list_item)
-                return True
-                
-    except Exception as e:
-        xbmc.log(f"Babel: Error with direct downlad: {e}", xbmc.LOGERROR)
-        xbmcgui.Dialog().notification("Babel Error", "Couldn't download subtitle file.")
-    
-    return False
+        response = await async_client.open(url, conditional_headers(entry))
 
-# Main function
-if __name__ == '__main__':
+        if is_not_modified(url, response, entry):
+            await response.read()
+            return reuse_page(entry, on_row, on_pagination)
 
-    # Getting parameters from sys.argv[2] used by Kodi
-    # [1:] cuts the questionmark (?) at the beginning
-    param_string = sys.argv[2][1:] if len(sys.argv) > 2 else ""
-    
-    # Transforming the parameter string to dict, thus 'searchstring' and
-    # 'resume' become separate keys
-    params = dict(parse_qsl(param_string))
+        async for chunk in response.iter_chunks():
+            start = time.perf_counter()
+            parser.feed(decoder.decode(chunk))
+            parse_seconds += time.perf_counter() - start
 
-    # Getting the action (action: auto or manual search)
-    action = params.get('action')
-    
-    xbmc.log(f"Babel Log: Action type: {action}", xbmc.LOGDEBUG)
+            for row in parser.pop_rows():
+                rows.append(row)
+                on_row(row)
 
-    # Manage search logic (auto and manual)
-    if action == 'search' or action == 'manualsearch':
-        
-        if action == 'manualsearch':
-            # In case of manual search we use the search string provided by
-            # the end-user. Sometimes Kodi adds the 'resume:false' string to
-            # the search string hence 'parse_qsl' used above removes this 
-            # unnecssary text.
+            # The rest of the result pages can be requested while this page
+            # is still downloading
+            if on_pagination is not None and parser.pages is not None:
+                on_pagination(parser.pages)
+                on_pagination = None
+
+        parser.feed(decoder.decode(b'', final=True))
+        parser.close()
+    except Exception as error:
+        xbmc.log(f"Babel: Connection error: {error}", xbmc.LOGERROR)
+        return None
+
+    # One 'parse' span is recorded per page
+    profiler.add('parse', parse_seconds)
+
+    for row in parser.pop_rows():
+        rows.append(row)
+        on_row(row)
+
+    if page_cache and not parser.maintenance:
+        page_cache.put(url, response.headers, rows, parser.pages)
+
+    return parser
+
+async def fetch_page_rows_async(async_client, url, page_cache=None):
+    """
+    Asyncio counterpart of fetch_page_rows(), used for the pages 2..N. The page is parsed by the regular expressions of extract_rows() at once, as it's much faster than the streaming parser and the parsing blocks the event loop
+
+    Args:
+        async_client: AsyncHttpClient of the search
+
+        url: URL of the result page
+
+        page_cache: PageCache of the validators and the rows of the result pages. Optional
+
+    Returns:
+        list: List of the (lang, title, download_link) tuples of the page or None if the page couldn't be downloaded
+
+    Raises:
+        None
+    """
+    entry = page_cache.get(url) if page_cache else None
+
+    try:
+        response = await async_client.get(url, conditional_headers(entry))
+    except Exception as error:
+        xbmc.log(f"Babel: Connection error: {error}", xbmc.LOGERROR)
+        return None
+
+    if is_not_modified(url, response, entry):
+        return entry['rows']
+
+    from resources.lib.parser import extract_rows
+
+    with profiler.span('parse'):
+        rows = extract_rows(response.body.decode('utf-8', errors='ignore'))
+
+    if page_cache:
+        page_cache.put(url, response.headers, rows, None)
+
+    return rows
+
+async def fetch_matches_async(http_query_params, on_row, should_stop=None, background=False, page_cache=None, budget=None):
+    """
+    Asyncio search engine, the counterpart of fetch_matches() with the same arguments and return value. The result pages are downloaded and parsed by coroutines of one event loop: the pages 2..N are requested as soon as the pagination block of page 1 is parsed, thus the parsing of page 1 overlaps with their download, and every page is parsed as soon as it arrives. The number of parallel downloads is limited by the 'page_workers' setting
+
+    Args:
+        http_query_params: Dict of the query string parameters of the search
+
+        on_row: Function called with every parsed (lang, title, download_link) tuple in page order
+
+        should_stop: Function checked after every page. If it returns True no further page is requested. Optional
+
+        background: True if the search runs in the background (see fetch_matches())
+
+        page_cache: PageCache that revalidates the result pages. Optional
+
+        budget: PageBudget shared by the queries of the search. The pages over the budget are not requested. Optional
+
+    Returns:
+        bool: True if every result page was downloaded, False otherwise. None is returned instead if the website is under maintenance
+
+    Raises:
+        None
+    """
+    if get_scheduler().breaker.is_open():
+        report_maintenance(background)
+        return None
+
+    import asyncio
+    from resources.lib.async_client import AsyncHttpClient
+
+    http_query_params['page'] = 1
+    url = build_search_url(http_query_params)
+
+    xbmc.log(f"Babel: Search URL called by Kodi (asyncio): {url}", xbmc.LOGINFO)
+
+    max_workers = 1 if background else max(1, get_setting_int('page_workers', 4))
+    slots = asyncio.Semaphore(max_workers)
+
+    if budget is not None and not budget.take():
+        xbmc.log("Babel: Page budget of the search is spent, the query is skipped.", xbmc.LOGINFO)
+        return False
+
+    async def fetch_page(page_url):
+        async with slots:
+            # A page whose turn comes after the early stop or over the budget
+            # of the search is not requested
+            if should_stop is not None and should_stop():
+                return None
+            if budget is not None and not budget.take():
+                return None
+            return await fetch_page_rows_async(async_client, page_url, page_cache)
+
+    async with AsyncHttpClient(headers=headers, profiler=profiler, scheduler=get_scheduler()) as async_client:
+        # Tasks of the pages 2..N in page order
+        tasks = list()
+
+        def download_remaining_pages(no_of_pages):
+            xbmc.log(f"Babel: Felirat oldalak száma: {no_of_pages}", xbmc.LOGINFO)
+
+            for i in range(2, no_of_pages + 1):
+                page_url = build_search_url(dict(http_query_params, page=i))
+                tasks.append(asyncio.ensure_future(fetch_page(page_url)))
+
+        parser = await parse_result_page_async(async_client, url, on_row, download_remaining_pages, page_cache)
+
+        try:
+            if parser is None:
+                return False
+
+            if parser.maintenance:
+                report_maintenance(background)
+                return None
+
+            # If the pagination block doesn't exist the result fits on one
+            # page
+            if parser.pages is None:
+                download_remaining_pages(1)
+
+            # Collecting the rows of pages 2..N in page order. A page that
+            # couldn't be downloaded is skipped
+            complete = True
+            for i, task in enumerate(tasks):
+                if should_stop is not None and should_stop():
+                    skipped = sum(1 for task in tasks[i:] if not task.done())
+                    xbmc.log(f"Babel: Enough good matches found, {skipped} pages are not requested.", xbmc.LOGINFO)
+                    return False
+
+                rows = await task
+                if rows is None:
+                    complete = False
+                else:
+                    for row in rows:
+                        on_row(row)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return complete
+
+def fetch_matches_with_asyncio(http_query_params, on_row, should_stop=None, background=False, page_cache=None, budget=None):
+    """
+    Synchronous wrapper of the asyncio search engine (see fetch_matches_async()), thus it can be used in place of fetch_matches()
+
+    Args:
+        http_query_params: Dict of the query string parameters of the search
+
+        on_row: Function called with every parsed (lang, title, download_link) tuple in page order
+
+        should_stop: Function checked after every page. If it returns True no further page is requested. Optional
+
+        background: True if the search runs in the background (see fetch_matches())
+
+        page_cache: PageCache that revalidates the result pages. Optional
+
+        budget: PageBudget shared by the queries of the search. The pages over the budget are not requested. Optional
+
+    Returns:
+        bool: True if every result page was downloaded, False otherwise. None is returned instead if the website is under maintenance
+
+    Raises:
+        None
+    """
+    import asyncio
+
+    return asyncio.run(fetch_matches_async(http_query_params, on_row, should_stop, background, page_cache, budget))
+
+def build_download_url(download_link):
+    """
+    Completes the download link of a subtitle row to a full URL
+
+    Args:
+        download_link: Download link of the subtitle as it's found on the result page
+
+    Returns:
+        string: The full download URL
+
+    Raises:
+        None
+    """
+    return main_link + download_link if download_link.startswith('/') else download_link
+
+def build_result(lang, title, download_link):
+    """
+    Creates the compact record of a found subtitle for the listing
+
+    Args:
+        lang: Language of the subtitle as it's written on https://feliratok.eu
+
+        title: Title of the subtitle, already cleaned by the parser
+
+        download_link: Download link of the subtitle, already unescaped by the parser
+
+    Returns:
+        SubtitleResult: The record of the subtitle
+
+    Raises:
+        None
+    """
+    # The flag icon is named by the ISO code of the 'languages' translation
+    # dict defined at the beginning of this code
+    # A language missing from the dict gets no flag instead of breaking the
+    # listing
+    return SubtitleResult(lang, languages.get(lang, ''), title, build_download_url(download_link))
+
+def build_list_item(result):
+    """
+    Creates the Kodi list item of a found subtitle. These 'list_items' appear in the result dropdown list of Kodi
+
+    Args:
+        result: SubtitleResult of the subtitle
+
+    Returns:
+        tuple: (callback_url, list_item, is_folder) item of xbmcplugin.addDirectoryItems(). If the user clicks on the subtitle the callback URL hands over the download URL and the title to the download() function
+
+    Raises:
+        None
+    """
+    # An offscreen item is not bound to the GUI, thus creating it doesn't
+    # lock the GUI of Kodi for every single item
+    list_item = xbmcgui.ListItem(label=result.title, label2=result.title, offscreen=True)
+
+    # Setting the flag as icon and thumbnail
+    list_item.setArt({
+        'icon': result.code,
+        'thumb': result.code
+    })
+
+    # Setting the appropriate subtitle language
+    list_item.setProperty("Language", result.code)
+
+    # The setters of the info tag replaced setInfo() in Kodi 20. Kodi 19
+    # (Matrix) already has the info tag, but only with getters
+    info_tag = list_item.getVideoInfoTag()
+    if hasattr(info_tag, 'setTitle'):
+        info_tag.setTitle(result.title)
+    else:
+        list_item.setInfo('video', {'title': result.title})
+
+    params_to_send = {
+        'action': 'download',
+        'url': result.url,
+        'title': result.title
+    }
+    callback_url = f"{sys.argv[0]}?{urlencode(params_to_send)}"
+
+    return callback_url, list_item, False
+
+def add_results(handle, results):
+    """
+    Hands over the found subtitles to Kodi which lists them in the result window. Every item is handed over in one xbmcplugin.addDirectoryItems() call, thus the listing costs one round trip between Python and Kodi instead of one per subtitle
+
+    Args:
+        handle: Kodi process ID of the addon
+
+        results: Iterable of the SubtitleResult records in the order of the listing
+
+    Returns:
+        None
+
+    Raises:
+        None
+    """
+    items = [build_list_item(result) for result in results]
+    if items:
+        xbmcplugin.addDirectoryItems(handle, items, len(items))
+
+def get_search_cache():
+    """
+    Creates the search result cache stored in the addon data folder. Its lifetime and size are defined by the 'cache_ttl' (minutes) and 'cache_size' (no. of searches) settings
+
+    Args:
+        None
+
+    Returns:
+        SearchCache: The cache of the search results
+
+    Raises:
+        None
+    """
+    profile_dir = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
+    return SearchCache(
+        os.path.join(profile_dir, 'search_cache.json'),
+        ttl=get_setting_int('cache_ttl', 60) * 60,
+        max_entries=get_setting_int('cache_size', 50)
+    )
+
+def get_page_cache():
+    """
+    Creates the cache of the validators and the parsed rows of the result pages stored in the addon data folder. Its size is limited by the 'page_cache_size' setting (no. of pages)
+
+    Args:
+        None
+
+    Returns:
+        PageCache: The cache of the result pages
+
+    Raises:
+        None
+    """
+    profile_dir = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
+    return PageCache(
+        os.path.join(profile_dir, 'page_cache.json'),
+        max_entries=get_setting_int('page_cache_size', 200)
+    )
+
+def get_download_cache():
+    """
+    Creates the cache of the downloaded subtitle files stored in the addon data folder. Its size is limited by the 'download_cache_size' setting (MB)
+
+    Args:
+        None
+
+    Returns:
+        DownloadCache: The cache of the downloaded subtitle files
+
+    Raises:
+        None
+    """
+    profile_dir = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
+    return DownloadCache(
+        os.path.join(profile_dir, 'downloads'),
+        max_bytes=get_setting_int('download_cache_size', 20) * 1024 * 1024
+    )
+
+def get_player_metadata():
+    """
+    Collects the metadata of the media currently played by Kodi that can narrow the search (see log_netmozi_metadata() also)
+
+    Args:
+        None
+
+    Returns:
+        dict: The 'tvshow', 'season', 'episode', 'imdb', 'original_title' and 'file_name' values of the played media. Unknown season and episode numbers are 0. None is returned if no media is played
+
+    Raises:
+        None
+    """
+    player = xbmc.Player()
+
+    if not player.isPlayingVideo():
+        return None
+
+    tag = player.getVideoInfoTag()
+
+    # Kodi returns -1 if the season or the episode number is unknown
+    return {
+        'tvshow': tag.getTVShowTitle(),
+        'season': max(tag.getSeason(), 0),
+        'episode': max(tag.getEpisode(), 0),
+        'imdb': tag.getIMDBNumber(),
+        'original_title': tag.getOriginalTitle(),
+        'file_name': player.getPlayingFile(),
+    }
+
+def get_series_index():
+    """
+    Creates the index of the series IDs of https://feliratok.eu stored in the addon data folder
+
+    Args:
+        None
+
+    Returns:
+        SeriesIndex: The index of the series IDs
+
+    Raises:
+        None
+    """
+    from resources.lib.series_index import SeriesIndex
+
+    profile_dir = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
+    return SeriesIndex(os.path.join(profile_dir, 'series.db'))
+
+def resolve_series_id(title):
+    """
+    Asks https://feliratok.eu for the ID of a series through the name suggestion of its search form ('action=autoname'). Only a suggestion whose name is the given title is accepted
+
+    Args:
+        title: Title of the series
+
+    Returns:
+        string: The ID of the series, '' if the website doesn't know the title or None if the lookup failed
+
+    Raises:
+        None
+    """
+    from resources.lib.series_index import title_matches
+
+    url = f"{main_link}/index.php?action=autoname&nyelv=0&term={quote(title)}"
+
+    try:
+        suggestions = json.loads(get_client().get(url).body.decode('utf-8', errors='ignore'))
+    except Exception as error:
+        xbmc.log(f"Babel: Series ID lookup failed: {error}", xbmc.LOGWARNING)
+        return None
+
+    if not isinstance(suggestions, list):
+        return None
+
+    for suggestion in suggestions:
+        if isinstance(suggestion, dict) and suggestion.get('ID') and title_matches(suggestion.get('name', ''), title):
+            return str(suggestion['ID'])
+
+    return ''
+
+def find_series_id(title, imdb='', resolve=True):
+    """
+    Finds the feliratok.eu ID of a series. The persistent index is checked first, and a resolved ID is stored in it, thus the later searches of the series need no lookup. A title unknown to the website is stored as a miss, thus it's not looked up on every search either. The 'series_index' setting disables the IDs
+
+    Args:
+        title: Title of the series
+
+        imdb: IMDb number of the played media. Optional
+
+        resolve: If it's True a series missing from the index is looked up on the website
+
+    Returns:
+        string: The ID of the series or '' if it's unknown
+
+    Raises:
+        None
+    """
+    if not get_setting_bool('series_index'):
+        return ''
+
+    from resources.lib.series_index import normalize_title
+
+    if not normalize_title(title):
+        return ''
+
+    index = get_series_index()
+    try:
+        sid = index.lookup(title, imdb)
+        if sid is None and resolve:
+            # A title unknown to the website ('') is stored as a miss, a
+            # failed lookup (None) is not stored, thus it's retried by the
+            # next search
+            sid = resolve_series_id(title)
+            if sid:
+                xbmc.log(f"Babel: Series ID of '{title}' is {sid}.", xbmc.LOGINFO)
+                index.remember(sid, title, imdb)
+            elif sid == '':
+                xbmc.log(f"Babel: Series ID of '{title}' is unknown.", xbmc.LOGINFO)
+                index.remember_miss(title, imdb)
+    finally:
+        index.close()
+
+    return sid or ''
+
+def build_query_params(media_title, metadata=None, sid='', wanted_languages=()):
+    """
+    Defines the parameters of the query string that is used to complie the final URL that is called for the web search. If the metadata of a tv series episode is available a complex search is built for the series name, season and episode instead of the free text search of the title, thus the result fits on far fewer pages. If the ID of the series is known the search is filtered by it instead of the text of the title
+
+    Args:
+        media_title: Title of the media currently played or the search term submitted by the user through the 'Manual search' option from Kodi
+
+        metadata: Metadata of the played media returned by get_player_metadata(). Optional
+
+        sid: ID of the series on https://feliratok.eu returned by find_series_id(). Optional
+
+        wanted_languages: Language names of the website returned by get_wanted_languages(). Optional
+
+    Returns:
+        dict: The query string parameters of the search
+
+    Raises:
+        None
+    """
+    http_query_params = {
+        'search': media_title,
+        'soriSorszam': '',
+        'nyelv': '',
+        'sorozatnev': '',
+        'sid': '',
+        'complexsearch': 'true',
+        'knyelv': 0,
+        'evad': '',
+        'epizod1': '',
+        'elotag': 0,
+        'minoseg': 0,
+        'rlsr': 0,
+        'tab': 'all',
+        'page': 1,
+    }
+
+    # https://feliratok.eu has no IMDb filter, thus only the series (by its
+    # name or ID), season and episode number can narrow the query
+    if metadata and metadata['tvshow'] and metadata['season'] and metadata['episode']:
+        http_query_params['search'] = ''
+        http_query_params['sorozatnev'] = metadata['tvshow']
+        http_query_params['evad'] = metadata['season']
+        http_query_params['epizod1'] = metadata['episode']
+
+    if sid:
+        http_query_params['search'] = ''
+        http_query_params['sid'] = sid
+
+    # The website filters by one language only, more languages are filtered
+    # while the result pages are parsed (see find_matches())
+    if len(wanted_languages) == 1:
+        http_query_params['nyelv'] = wanted_languages[0]
+
+    return http_query_params
+
+def find_matches(http_query_params, ranker=None, background=False, wanted_languages=(), budget=None, search_cache=None, page_cache=None):
+    """
+    Collects the subtitles found by the given query. If the same search was executed recently its result is served from the search cache without touching the network. If the 'early_stop' setting is set and a ranker is given no further result page is requested once that many high-confidence matches are found
+
+    Args:
+        http_query_params: Dict of the query string parameters of the search
+
+        ranker: Ranker that recognizes the high-confidence matches. Optional
+
+        background: True if the search runs in the background (see fetch_matches())
+
+        wanted_languages: Language names of the website returned by get_wanted_languages(). The rows of the other languages are dropped as soon as they are parsed. Optional
+
+        budget: PageBudget shared by the queries of the search (see fetch_matches()). Optional
+
+        search_cache: SearchCache shared by the queries of the search. A new one is created and saved if it's not given
+
+        page_cache: PageCache shared by the queries of the search. A new one is created and saved if it's not given
+
+    Returns:
+        list: List of the found (lang, title, download_link) tuples. None is returned if the website is under maintenance
+
+    Raises:
+        None
+    """
+    # Checking whether the same search was executed recently. A shared
+    # search cache is saved by the owner once every query is finished
+    own_search_cache = search_cache is None
+    cache = get_search_cache() if own_search_cache else search_cache
+    wanted = frozenset(wanted_languages)
+    cache_key = normalize_query(http_query_params, wanted)
+    matches = cache.get(cache_key)
+
+    if matches is not None:
+        xbmc.log(f"Babel: {len(matches)} subtitles served from the search cache.", xbmc.LOGINFO)
+        if own_search_cache:
+            cache.save()
+        return matches
+
+    matches = list()
+    early_stop = get_setting_int('early_stop', 0) if ranker else 0
+    confident = [0]
+
+    def on_row(row):
+        # The page cache keeps every row of the pages, the filter applies to
+        # the result of the search only
+        if wanted and row[0] not in wanted:
+            return
+        matches.append(row)
+        if early_stop and ranker.is_confident(row):
+            confident[0] += 1
+
+    def should_stop():
+        return early_stop > 0 and confident[0] >= early_stop
+
+    # The 'async_engine' setting selects the asyncio search engine instead
+    # of the worker threads
+    fetch = fetch_matches_with_asyncio if get_setting_bool('async_engine') else fetch_matches
+
+    # The result pages seen before are revalidated by conditional requests.
+    # A shared page cache is saved by the owner once every query is finished
+    own_page_cache = page_cache is None
+    if own_page_cache:
+        page_cache = get_page_cache()
+    complete = fetch(http_query_params, on_row, should_stop, background, page_cache, budget)
+    if own_page_cache:
+        page_cache.save()
+
+    # Nothing is found while the website is under maintenance
+    if complete is None:
+        return None
+
+    # Only complete results are cached, thus a page that couldn't be
+    # downloaded (or wasn't downloaded because of the early stop) doesn't
+    # hide subtitles for the whole lifetime of the entry
+    if complete:
+        cache.put(cache_key, matches)
+        if own_search_cache:
+            cache.save()
+
+    return matches
+
+def build_search_queries(media_title, metadata=None, wanted_languages=()):
+    """
+    Builds the candidate queries of a search in the order of their precision. The first one is narrowed to the played episode (by the ID or the name of the series), the next one searches for the title. If the 'search_fan_out' setting is set the original title and the title in the file name of the played media are searched for also (see find_batches())
+
+    Args:
+        media_title: Title of the media currently played or the search term submitted by the user
+
+        metadata: Metadata of the played media returned by get_player_metadata(). Optional
+
+        wanted_languages: Language names of the website returned by get_wanted_languages(). Optional
+
+    Returns:
+        list: The query string parameter dicts of the different queries
+
+    Raises:
+        None
+    """
+    # The search is filtered by the ID of the series if it's known. The ID of
+    # a played series is looked up on the website once, a manual search uses
+    # the IDs found before only
+    if metadata and metadata['tvshow']:
+        sid = find_series_id(metadata['tvshow'], metadata['imdb'])
+    else:
+        sid = find_series_id(media_title, resolve=False)
+
+    queries = [build_query_params(media_title, metadata, sid, wanted_languages)]
+
+    # If the series name of Kodi differs from the one of the website the
+    # narrowed search finds nothing, then the title is searched for
+    if media_title:
+        queries.append(build_query_params(media_title, wanted_languages=wanted_languages))
+
+    if metadata and get_setting_bool('search_fan_out'):
+        from resources.lib.ranking import release_title
+
+        for title in (metadata.get('original_title'), release_title(metadata.get('file_name'))):
+            if title:
+                queries.append(build_query_params(title, wanted_languages=wanted_languages))
+
+    # The same query is sent once, e.g. if the original title is the title
+    unique = dict()
+    for query in queries:
+        unique.setdefault(json.dumps(normalize_query(query), sort_keys=True), query)
+
+    return list(unique.values())
+
+def find_batches(queries, ranker, wanted_languages=()):
+    """
+    Runs the candidate queries of a search. The first (the most precise) query runs alone, the broader ones run only if it found nothing. If the 'search_fan_out' setting is set the broader queries run at the same time, and the result pages downloaded by them together are limited by the 'search_page_budget' setting. Otherwise the next query runs only if the previous ones found nothing
+
+    Args:
+        queries: Query string parameter dicts returned by build_search_queries()
+
+        ranker: Ranker that recognizes the high-confidence matches (see find_matches())
+
+        wanted_languages: Language names of the website returned by get_wanted_languages(). Optional
+
+    Returns:
+        list: The found (lang, title, download_link) tuples of every query in the order of the queries. The batch of a query not run is an empty list, the one of a query that saw the maintenance page is None
+
+    Raises:
+        None
+    """
+    # The queries share the caches, thus the cache files are read and written
+    # once per search
+    search_cache = get_search_cache()
+    page_cache = get_page_cache()
+    fan_out = len(queries) > 2 and get_setting_bool('search_fan_out')
+    budget = None
+
+    def run(query):
+        return find_matches(query, ranker, wanted_languages=wanted_languages, budget=budget,
+                            search_cache=search_cache, page_cache=page_cache)
+
+    # The narrowed query usually fits on a page or two, thus the broader
+    # queries, which page through the whole title, are not sent if it found
+    # something
+    batches = [run(queries[0])]
+
+    if fan_out and not batches[0] and batches[0] is not None:
+        from concurrent.futures import ThreadPoolExecutor
+        from resources.lib.scheduler import PageBudget
+
+        xbmc.log("Babel: Nothing found by the narrowed query, running the broader ones.", xbmc.LOGINFO)
+        budget = PageBudget(get_setting_int('search_page_budget', 30))
+
+        with ThreadPoolExecutor(max_workers=len(queries) - 1) as executor:
+            batches += executor.map(run, queries[1:])
+    else:
+        for query in queries[1:]:
+            if batches[-1] is None or batches[-1]:
+                break
+            xbmc.log("Babel: Nothing found by the previous query, running the next one.", xbmc.LOGINFO)
+            batches.append(run(query))
+        batches += [list()] * (len(queries) - len(batches))
+
+    search_cache.save()
+    page_cache.save()
+    return batches
+
+def list_search_results(handle, batches, ranker):
+    """
+    Lists the subtitles found by the queries of a search. The subtitles of the first query that found any are ranked and listed first, the ones found only by the later queries are ranked and appended to them. A subtitle found by several queries is listed once. The 'top_k' setting caps the size of the listing
+
+    Args:
+        handle: Kodi process ID of the addon
+
+        batches: The found (lang, title, download_link) tuples of the queries returned by find_batches()
+
+        ranker: Ranker that scores the found subtitles against the played media
+
+    Returns:
+        int: Number of the found subtitles, without the repetitions of a release. None is returned if a query saw the maintenance page and no query found anything
+
+    Raises:
+        None
+    """
+    # Nothing is listed while the website is under maintenance. A query that
+    # saw the maintenance page stops the search, thus the batches after it
+    # are empty lists of the queries not run
+    if None in batches and not any(batches):
+        return None
+
+    # The repetitions of a release are dropped before the ranking, thus the
+    # 'top_k' places of the listing go to different releases
+    first = list()
+    rest = list()
+    for batch in batches:
+        if batch:
+            (rest if first else first).extend(batch)
+    first = unique_rows(first)
+    first_keys = {release_key(row[2]) for row in first}
+    rest = [row for row in unique_rows(rest) if release_key(row[2]) not in first_keys]
+
+    top_k = get_setting_int('top_k', 0)
+    with profiler.span('listing'):
+        ranked = ranker.rank(first, top_k)
+        if not top_k or len(ranked) < top_k:
+            ranked += ranker.rank(rest, top_k - len(ranked) if top_k else 0)
+        add_results(handle, (build_result(*row) for row in ranked))
+
+    return len(first) + len(rest)
+
+def get_preferred_languages(params):
+    """
+    Translates the subtitle languages set in Kodi to ISO 639-1 codes. Kodi hands them over to the addon in the 'preferredlanguage' and 'languages' parameters by their English names
+
+    Args:
+        params: Parameters of the plugin invocation
+
+    Returns:
+        list: ISO 639-1 codes of the languages, the preferred one is the first
+
+    Raises:
+        None
+    """
+    names = [params.get('preferredlanguage', '')] + params.get('languages', '').split(',')
+
+    codes = list()
+    for name in names:
+        code = xbmc.convertLanguage(name.strip(), xbmc.ISO_639_1) if name.strip() else ''
+        if code and code not in codes:
+            codes.append(code)
+
+    return codes
+
+def get_wanted_languages(preferred_languages):
+    """
+    Translates the subtitle languages of Kodi to the language names of https://feliratok.eu through the reverse index of the 'languages' dict. Only the subtitles of these languages and the Hungarian ones are listed. The 'language_filter' setting disables the filter
+
+    Args:
+        preferred_languages: ISO 639-1 codes of the subtitle languages returned by get_preferred_languages()
+
+    Returns:
+        list: Language names of the website in order of preference, Hungarian is the last one if it's not set in Kodi. The list is empty if every language is listed: the filter is disabled or none of the languages is on the website
+
+    Raises:
+        None
+    """
+    if not get_setting_bool('language_filter'):
+        return list()
+
+    names = list()
+    for code in preferred_languages:
+        for name in language_names.get(code, ()):
+            if name not in names:
+                names.append(name)
+
+    # Most of the subtitles of the website are Hungarian, thus they are
+    # always listed. Kodi's default subtitle language is English only, then
+    # the search isn't narrowed to the English subtitles on the website
+    if names:
+        names += [name for name in language_names['hu'] if name not in names]
+
+    return names
+
+def build_ranker(metadata=None, preferred_languages=()):
+    """
+    Creates the Ranker of the search from the played file and its metadata
+
+    Args:
+        metadata: Metadata of the played media returned by get_player_metadata(). Optional
+
+        preferred_languages: ISO 639-1 codes of the preferred subtitle languages
+
+    Returns:
+        Ranker: The ranker of the search results
+
+    Raises:
+        None
+    """
+    player = xbmc.Player()
+    file_name = player.getPlayingFile() if player.isPlayingVideo() else ''
+
+    return Ranker(
+        languages,
+        preferred_languages,
+        file_name=file_name,
+        season=metadata['season'] if metadata else 0,
+        episode=metadata['episode'] if metadata else 0
+    )
+
+def search(media_title, metadata=None, preferred_languages=()):
+    """
+    Actual subtitle serach of the media on the https://feliratok.hu website. Result of this search is handed over to the download() function which executes the actual subtitle download.
+
+    Args:
+        media_title: Title of the media currently played or the search term submitted by the user through the 'Manual search' option from Kodi
+
+        metadata: Metadata of the played media returned by get_player_metadata(). If it's given the search is narrowed to the played episode. Optional
+
+        preferred_languages: ISO 639-1 codes of the preferred subtitle languages, used to rank and filter the found subtitles
+
+    Returns:
+        None. The found subtitles are listed by the add_results() function
+
+    Raises:
+        None
+    """
+    # Querying the Kodi process ID of the addon
+    handle = int(sys.argv[1])
+    xbmcplugin.setContent(handle, 'subtitles')
+
+    reset_maintenance_report()
+    ranker = build_ranker(metadata, preferred_languages)
+    wanted_languages = get_wanted_languages(preferred_languages)
+
+    queries = build_search_queries(media_title, metadata, wanted_languages)
+    found = list_search_results(handle, find_batches(queries, ranker, wanted_languages), ranker)
+
+    # Nothing is listed while the website is under maintenance
+    if found is None:
+        return
+
+    xbmcplugin.endOfDirectory(handle)
+
+def get_played_episode(title=''):
+    """
+    Finds the season and episode number of the played episode, which selects the subtitle of a season pack
+
+    Args:
+        title: Title of the downloaded subtitle, used if the played media has no episode information
+
+    Returns:
+        tuple: (season, episode) pair of integers, (0, 0) if the episode is unknown
+
+    Raises:
+        None
+    """
+    metadata = get_player_metadata()
+    if metadata and metadata['season'] and metadata['episode']:
+        return metadata['season'], metadata['episode']
+
+    # The file name of the played media and the title of the subtitle may
+    # contain an episode marker (e.g. S01E02) also
+    names = [title]
+    player = xbmc.Player()
+    if player.isPlayingVideo():
+        names.insert(0, os.path.basename(player.getPlayingFile()))
+
+    for name in names:
+        found = find_episode(name)
+        if found:
+            return found
+
+    return 0, 0
+
+def save_subtitle(source_path, dest_path, title=''):
+    """
+    Copies a downloaded subtitle to its destination. If the downloaded file is a zip or rar archive only the subtitle of the played episode is extracted from it
+
+    Args:
+        source_path: Local path of the downloaded file
+
+        dest_path: Destination path of the subtitle
+
+        title: Title of the downloaded subtitle
+
+    Returns:
+        string: Path of the saved subtitle or None if nothing was saved. The extension of the destination follows the extension of the subtitle extracted from an archive
+
+    Raises:
+        OSError: If the downloaded file can't be read
+
+        zipfile.BadZipFile: If the downloaded zip archive is corrupted
+    """
+    from resources.lib.archive import choose_subtitle, extract_zip_file, list_zip, sniff
+
+    with open(source_path, 'rb') as f:
+        archive_type = sniff(f.read(8))
+
+    # A plain subtitle file is copied as it is
+    if archive_type is None:
+        with profiler.span('write'):
+            return dest_path if xbmcvfs.copy(source_path, dest_path) else None
+
+    season, episode = get_played_episode(title)
+
+    # The zip archives are handled by Python, the rar archives by the
+    # archive support of Kodi
+    if archive_type == 'zip':
+        names = list_zip(source_path)
+    else:
+        archive_url = f"rar://{quote_plus(source_path)}/"
+        _, names = xbmcvfs.listdir(archive_url)
+
+    name = choose_subtitle(names, season, episode)
+    if name is None:
+        xbmc.log(f"Babel: No subtitle found in the {archive_type} archive.", xbmc.LOGERROR)
+        return None
+
+    # Kodi recognizes the format of the subtitle by its extension
+    dest_path = os.path.splitext(dest_path)[0] + os.path.splitext(name)[1].lower()
+    xbmc.log(f"Babel: Extracting {name} from the {archive_type} archive.", xbmc.LOGINFO)
+
+    with profiler.span('write'):
+        if archive_type == 'zip':
+            with xbmcvfs.File(dest_path, 'w') as target:
+                extract_zip_file(source_path, name, target)
+            return dest_path
+
+        return dest_path if xbmcvfs.copy(archive_url + name, dest_path) else None
+
+def stream_subtitle(url, dest_path, cache, title=''):
+    """
+    Downloads a subtitle in fixed-size chunks, thus the file is never held in memory. A plain subtitle is written straight to its destination, an archive is written to the disk first and only the subtitle of the played episode is extracted from it. The downloaded file is stored in the download cache also
+
+    Args:
+        url: Download URL of the subtitle
+
+        dest_path: Destination path of the subtitle
+
+        cache: The DownloadCache of the addon
+
+        title: Title of the downloaded subtitle
+
+    Returns:
+        string: Path of the saved subtitle or None if nothing was saved
+
+    Raises:
+        HttpError: If https://feliratok.eu responds with an error status code
+
+        OSError: If the download or the writing of the file fails
+    """
+    # The shared client sends the User-Agent to avoid banning the script from
+    # https://feliratok.eu and reuses the connection of the search
+    chunks = get_client().open(url).iter_chunks()
+
+    # The type of the file is recognized by its first bytes
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= 8:
+            break
+
+    writer = None
+    if cache.enabled:
+        try:
+            writer = cache.writer(url)
+        except OSError as e:
+            xbmc.log(f"Babel: Download cache is not available: {e}", xbmc.LOGWARNING)
+
+    from resources.lib.archive import sniff
+
+    if sniff(head) is None:
+        # Writing directly to the destination file with xbmcvfs. xbmcvfs.File
+        # is the most reliable format on every platform
+        # (Android/Windows/Linux)
+        try:
+            with profiler.span('write'), xbmcvfs.File(dest_path, 'w') as target:
+                success = target.write(head)
+                if writer:
+                    writer.write(head)
+                for chunk in chunks:
+                    success = target.write(chunk) and success
+                    if writer:
+                        writer.write(chunk)
+        except BaseException:
+            if writer:
+                writer.discard()
+            raise
+
+        if writer:
+            if success:
+                writer.commit()
+            else:
+                writer.discard()
+
+        return dest_path if success else None
+
+    # An archive has to be on the disk to extract a file from it. It's
+    # written to the download cache or to a temporary file if the cache is
+    # disabled
+    if writer:
+        spool, spool_path = writer, writer.path
+    else:
+        import tempfile
+        spool = tempfile.NamedTemporaryFile(dir=xbmcvfs.translatePath('special://temp'), delete=False)
+        spool_path = spool.name
+
+    try:
+        with profiler.span('write'):
+            spool.write(head)
+            for chunk in chunks:
+                spool.write(chunk)
+        spool.close()
+
+        dest_path = save_subtitle(spool_path, dest_path, title)
+    except BaseException:
+        if writer:
+            writer.discard()
+        raise
+    finally:
+        if not writer:
+            os.remove(spool_path)
+
+    if writer:
+        writer.commit()
+
+    return dest_path
+
+def download(url, title='', dest_path=None):
+    """
+    Downloads the subtile selected from the Kodi dorpdown list provided by the search() function
+
+    Args:
+        url: Download URL of the subtitle provided by the search() function and selected by the end user
+
+        title: Title of the selected subtitle, used to find the episode in a season pack if the played media has no episode information
+
+        dest_path: Destination path of the subtitle provided by Kodi ('destfile' parameter). Optional
+
+    Returns:
+        None.
+
+    Raises:
+        Exception: If nay excpetion occures during the download the function writes it to the kodi.log
+    """
+    # If the destiantion file path doesn't exist we create one into the 'temp'
+    # folder
+    if not dest_path:
+        temp_dir = xbmcvfs.translatePath('special://temp')
+        dest_path = os.path.join(temp_dir, 'felirat.srt')
+
+    xbmc.log(f"Babel: Subtitle download: {url} -> {dest_path}", xbmc.LOGINFO)
+
+    try:
+        # If the subtitle was downloaded before it's copied (or extracted)
+        # from the cache without any request to https://feliratok.eu
+        cache = get_download_cache()
+        cached_path = cache.get(url)
+
+        if cached_path:
+            xbmc.log("Babel: Subtitle served from the download cache.", xbmc.LOGINFO)
+            dest_path = save_subtitle(cached_path, dest_path, title)
+        else:
+            dest_path = stream_subtitle(url, dest_path, cache, title)
+        
+        if dest_path:
+            xbmc.log(f"Babel: Subtitle saved successfully: {dest_path}", xbmc.LOGINFO)
+            
+            # Important! We have to notify Kodi that the subtitle file is
+            # ready. For this we have to add the path of the downloaded
+            # subtitle file to the directory
+            list_item = xbmcgui.ListItem(label="Felirat")
+            xbmcplugin.addDirectoryItem(int(sys.argv[1]), dest_path, list_item)
+            return True
+                
+    except Exception as e:
+        xbmc.log(f"Babel: Error with direct downlad: {e}", xbmc.LOGERROR)
+        xbmcgui.Dialog().notification("Babel Error", "Couldn't download subtitle file.")
+    
+    return False
+
+def get_kodi_setting(setting_id):
+    """
+    Reads a setting of Kodi through JSON-RPC
+
+    Args:
+        setting_id: ID of the setting of Kodi (e.g. 'subtitles.languages')
+
+    Returns:
+        The value of the setting or None if it can't be read
+
+    Raises:
+        None
+    """
+    request = {
+        'jsonrpc': '2.0',
+        'method': 'Settings.GetSettingValue',
+        'params': {'setting': setting_id},
+        'id': 1,
+    }
+
+    try:
+        return json.loads(xbmc.executeJSONRPC(json.dumps(request)))['result']['value']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def get_subtitle_languages():
+    """
+    Translates the subtitle languages set in Kodi to ISO 639-1 codes. The background prefetch has no plugin parameters, thus the preferred subtitle language and the download languages are read from the settings of Kodi through JSON-RPC, the same ones Kodi hands over to the auto search
+
+    Args:
+        None
+
+    Returns:
+        list: ISO 639-1 codes of the languages, the preferred one is the first
+
+    Raises:
+        None
+    """
+    preferred = get_kodi_setting('locale.subtitlelanguage')
+    names = get_kodi_setting('subtitles.languages')
+
+    return get_preferred_languages({
+        'preferredlanguage': preferred if isinstance(preferred, str) else '',
+        'languages': ','.join(names) if isinstance(names, list) else '',
+    })
+
+def prefetch_download(url):
+    """
+    Downloads a subtitle into the download cache only, thus selecting it later in the subtitle dialog needs no request to https://feliratok.eu
+
+    Args:
+        url: Download URL of the subtitle
+
+    Returns:
+        None
+
+    Raises:
+        HttpError: If https://feliratok.eu responds with an error status code
+
+        OSError: If the download or the writing of the file fails
+    """
+    cache = get_download_cache()
+    if not cache.enabled or cache.get(url):
+        return
+
+    writer = cache.writer(url)
+    try:
+        for chunk in get_client().open(url).iter_chunks():
+            writer.write(chunk)
+    except BaseException:
+        writer.discard()
+        raise
+
+    writer.commit()
+
+def prefetch_episode(metadata, preferred_languages=(), with_download=False):
+    """
+    Warms the search cache (and the download cache optionally) for an episode. The search is the same as the auto search of the episode, thus opening the subtitle dialog on it is served from the cache
+
+    Args:
+        metadata: The 'tvshow', 'season' and 'episode' values of the episode (see get_player_metadata())
+
+        preferred_languages: ISO 639-1 codes of the subtitle languages of Kodi, used to filter the search like the auto search does and to choose the downloaded subtitle
+
+        with_download: If it's True the best ranked subtitle of the episode is downloaded also
+
+    Returns:
+        int: Number of the found subtitles. None is returned if the website is under maintenance
+
+    Raises:
+        None
+    """
+    xbmc.log(f"Babel: Prefetching {metadata['tvshow']} S{metadata['season']:02d}E{metadata['episode']:02d}", xbmc.LOGINFO)
+    reset_maintenance_report()
+
+    # The query is the same as the one of the auto search of the episode,
+    # thus it's served from the search cache later
+    sid = find_series_id(metadata['tvshow'], metadata.get('imdb', ''))
+    wanted_languages = get_wanted_languages(preferred_languages)
+    matches = find_matches(build_query_params('', metadata, sid, wanted_languages), background=True, wanted_languages=wanted_languages)
+    if not matches or not with_download:
+        return None if matches is None else len(matches)
+
+    ranker = Ranker(languages, preferred_languages, season=metadata['season'], episode=metadata['episode'])
+    _, _, download_link = ranker.rank(matches, 1)[0]
+
+    try:
+        prefetch_download(build_download_url(download_link))
+    except Exception as e:
+        xbmc.log(f"Babel: Error with the prefetch download: {e}", xbmc.LOGWARNING)
+
+    return len(matches)
+
+def main():
+    """
+    Entry point of the plugin invocation. Dispatches the action requested by Kodi in sys.argv, only the modules of the requested action are loaded (see the imports of the functions)
+
+    Args:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        None
+    """
+    # Getting parameters from sys.argv[2] used by Kodi
+    # [1:] cuts the questionmark (?) at the beginning
+    param_string = sys.argv[2][1:] if len(sys.argv) > 2 else ""
+    
+    # Transforming the parameter string to dict, thus 'searchstring' and
+    # 'resume' become separate keys
+    params = dict(parse_qsl(param_string))
+
+    # Getting the action (action: auto or manual search)
+    action = params.get('action')
+    
+    xbmc.log(f"Babel Log: Action type: {action}", xbmc.LOGDEBUG)
+
+    # Manage search logic (auto and manual)
+    if action == 'search' or action == 'manualsearch':
+        
+        if action == 'manualsearch':
+            # In case of manual search we use the search string provided by
+            # the end-user. Sometimes Kodi adds the 'resume:false' string to
+            # the search string hence 'parse_qsl' used above removes this 
+            # unnecssary text.
             query = params.get('searchstring', '')
             xbmc.log(f"Babel Log: Initiating manual search: {query}", xbmc.LOGINFO)
         else:
@@ -411,9 +1956,12 @@ if __name__ == '__main__':
             query = xbmc.getInfoLabel("VideoPlayer.Title")
             xbmc.log(f"Babel Log: Initiating auto search: {query}", xbmc.LOGINFO)
 
-        # If serch string is provided we call the search() function with it
+        # If serch string is provided we call the search() function with it.
+        # In case of auto search the metadata of the played media narrows
+        # the search to the played episode
         if query:
-            search(query)
+            metadata = get_player_metadata() if action == 'search' else None
+            search(query, metadata, get_preferred_languages(params))
         else:
             xbmc.log("Babel Log: Error - Empty search phrase!", xbmc.LOGERROR)
 
@@ -421,6 +1969,14 @@ if __name__ == '__main__':
     elif action == 'download':
         download_url = params.get('url')
         if download_url:
-            download(download_url)
+            download(download_url, params.get('title', ''), params.get('destfile'))
         else:
-            xbmc.log("Babel Log: Error - Missing download URL!", xbmc.LOGERROR) 
\ No newline at end of file
+            xbmc.log("Babel Log: Error - Missing download URL!", xbmc.LOGERROR) 
+
+    # Writing the timing spans of the invocation to the kodi.log in one line
+    if profiler.enabled:
+        xbmc.log(f"Babel: Profile: {profiler.summary(action=action)}", xbmc.LOGINFO)
+
+# Main function
+if __name__ == '__main__':
+    main()